@@ -20,203 +20,1361 @@ __status__ = "Production"
 __version__ = "1.3"
 
 
-from requests import get, exceptions
-from json import load
-from time import time, sleep, strftime
-from os.path import isdir
-from os import mkdir
+from requests import Session, adapters, exceptions
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from threading import Thread, Lock, Event
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from collections import deque
+from json import load, loads, dumps
+from time import time, sleep, strftime, monotonic, localtime
+from os.path import isdir, isfile, getmtime
+from os import mkdir, remove, replace, utime
 from sys import exit
+from math import log, inf
 from string import ascii_lowercase, digits
+from itertools import islice
+from heapq import heappush, heappushpop
+from random import uniform, randrange
+from hashlib import blake2b
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import MemoryHandler
+import logging
+from argparse import ArgumentParser
 import csv
-import pandas
-import warnings
+import re
+import sqlite3
+import socket
+import struct
+import numpy
+import xlsxwriter
 import atexit
+import signal
 
-warnings.filterwarnings(action='ignore', category=FutureWarning)
+# Statuses are stored as these codes (the index of their label) and only converted to labels when exported
+STATUS_LABELS = ("Unknown", "Available", "Unavailable", "Unavailable (pre-filter)")
+STATUS_CODES = {label: code for code, label in enumerate(STATUS_LABELS)}
+# Relative frequency (%) of each letter in English text; used to judge how pronounceable names are without a dictionary
+LETTER_FREQUENCIES = dict(zip(ascii_lowercase, (8.2, 1.5, 2.8, 4.3, 12.7, 2.2, 2.0, 6.1, 7.0, 0.15, 0.77, 4.0, 2.4, 6.7,
+                                                7.5, 1.9, 0.095, 6.0, 6.3, 9.1, 2.8, 0.98, 2.4, 0.15, 2.0, 0.074)))
+EXCEL_MAX_ROWS = 1048576  # rows per sheet (including the header); results past this continue on another sheet
+# A valid (lowercase) label: letters, digits and single hyphens between them, or a punycode (IDNA) label
+LABEL_PATTERN = r"(?=[a-z0-9-]{1,63}(?:\.|$))(?:xn--)?[a-z0-9]+(?:-[a-z0-9]+)*"
+ROOT_DOMAIN_REGEX = re.compile(LABEL_PATTERN)
+DOMAIN_REGEX = re.compile(LABEL_PATTERN + r"(?:\." + LABEL_PATTERN + ")+")
 
 
-def export_to_excel(dataframe, filename):
-    """ Exports a pandas dataframe to an excel spreadsheet """
-    try:
-        # Setup excel writer, workbook and sheet
-        writer = pandas.ExcelWriter(filepath + filename + ".xlsx", engine='xlsxwriter')
-        dataframe.to_excel(writer, sheet_name="Sheet1")
-        workbook = writer.book
-        sheet = writer.sheets["Sheet1"]
-        # Get the dimensions of the dataframe and adjust column size
-        (max_row, max_col) = dataframe.shape
-        sheet.set_column(0, max_col, 10)
-        # Add conditional formatting and freeze frames
-        sheet.freeze_panes(1, 1)
-        avail_form = workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})
-        unavail_form = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-        sheet.conditional_format(1, 1, max_row, max_col,
-                                 {'type': 'cell',
-                                  'criteria': 'equal to',
-                                  'value': '"Available"',
-                                  'format': avail_form})
-        sheet.conditional_format(1, 1, max_row, max_col,
-                                 {'type': 'cell',
-                                  'criteria': 'equal to',
-                                  'value': '"Unavailable"',
-                                  'format': unavail_form})
-        writer.save()  # TODO: Change to use 'with open'... and remove filter warning
-    except OSError:
-        log_print("ERROR:\tFile export location/path is invalid")
-        log_print("STATUS:\tAborting due to above error")
-        exit(1)
+class Metrics:
+    """ Thread-safe counters and timings for the run; each event is also written (buffered) to a JSON lines file so that
+    where a run spends its time can be analysed afterwards """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", buffering=64 * 1024)
+        self.lock = Lock()
+        self.start = monotonic()
+        self.totals = {}
+        self.latencies = deque(maxlen=100000)  # only the most recent, so a long-running service does not grow
+        self.summarised = False
+
+    def event(self, name, **fields):
+        """ Writes an event with the param fields to the metrics file """
+        line = dumps({"time": round(time(), 3), "event": name, **fields})
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def add(self, name, amount=1):
+        """ Adds the param amount to a running total """
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        """ Context manager adding the time spent within it to the param total (in seconds) """
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, monotonic() - started)
+
+    def excluding(self, items, name):
+        """ Yields the param items, taking the time spent producing each off the param total; used to time a consumer
+        of a generator without including the generator's own time """
+        items = iter(items)
+        while True:
+            started = monotonic()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, started - monotonic())
+            yield item
+
+    def record_request(self, latency, domains, key, outcome):
+        """ Records an API call's latency, number of domains and outcome (status code or error) """
+        with self.lock:
+            self.latencies.append(latency)
+        self.add("requests")
+        self.add("failed_requests", outcome == "network_error")
+        self.event("request", latency=round(latency, 4), domains=domains, key=key, outcome=outcome)
+
+    def snapshot(self):
+        """ Returns the running totals, along with the time elapsed and the p50/p99 API call latency so far """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            totals = {name: round(value, 3) for name, value in self.totals.items()}
+        p50 = latencies[len(latencies) // 2] if latencies else 0
+        p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] if latencies else 0
+        return {"elapsed": round(monotonic() - self.start, 3), "p50_latency": round(p50, 4),
+                "p99_latency": round(p99, 4), **totals}
+
+    def summary(self):
+        """ Prints and logs a short summary of the run, and writes it to the metrics file """
+        if self.summarised:
+            return
+        self.summarised = True
+        snapshot = self.snapshot()
+        elapsed = snapshot["elapsed"]
+        p50 = snapshot["p50_latency"]
+        p99 = snapshot["p99_latency"]
+        total = self.totals.get
+        log_print("INFO:\tRun metrics: {} API calls (p50 {:.0f}ms, p99 {:.0f}ms), {} failed; {} domains checked "
+                  "({:.1f} per min) in {:.0f} seconds".format(total("requests", 0), p50 * 1000, p99 * 1000,
+                                                              total("failed_requests", 0), total("domains_checked", 0),
+                                                              total("domains_checked", 0) * 60 / max(elapsed, 1),
+                                                              elapsed))
+        log_print("\t\tSeconds waiting (summed across threads) on rate limits: {:.0f}, retry-after pauses: {:.0f}, "
+                  "retry backoff: {:.0f}"
+                  .format(total("rate_limit_wait_seconds", 0), total("retry_after_seconds", 0),
+                          total("retry_wait_seconds", 0)))
+        log_print("\t\tSeconds generating root domains: {:.1f}, pre-filtering: {:.1f}, exporting: {:.1f}"
+                  .format(total("root_generation_seconds", 0), total("prefilter_seconds", 0),
+                          total("export_seconds", 0)))
+        self.event("summary", **snapshot)
+        self.file.close()
+
+
+class RateLimiter:
+    """ Thread-safe token bucket used to spread API calls evenly over each minute rather than using up the calls per
+    minute in a burst and then sleeping out the rest of the minute """
+
+    def __init__(self, calls_per_minute, capacity=1):
+        self.rate = calls_per_minute / 60
+        self.capacity = max(1, capacity)
+        self.tokens = 1
+        self.last = monotonic()
+        self.resume_at = 0
+        self.lock = Lock()
+
+    def acquire(self):
+        """ Blocks until a call can be made without exceeding the rate limit """
+        while (wait := self.try_acquire()) > 0:
+            sleep(wait)
+
+    def try_acquire(self):
+        """ Takes a call from the limit if one can be made now and returns 0, else returns the seconds until one can """
+        if self.rate <= 0:  # Non-positive calls per min disables the limit
+            return 0
+        with self.lock:
+            now = monotonic()
+            if now < self.resume_at:
+                return self.resume_at - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """ Stops any calls from being made for the param number of seconds (e.g. when told to retry after) """
+        with self.lock:
+            self.resume_at = max(self.resume_at, monotonic() + seconds)
+            self.tokens = 0
+            self.last = self.resume_at
+
+
+class RetryPolicy:
+    """ Exponential backoff (with jitter) for API calls that fail due to network errors, and a circuit breaker that
+    stops calls from being attempted for a cool-down period once too many in a row have failed """
+
+    def __init__(self, max_retries, base_delay, max_delay, failure_threshold):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = max(1, failure_threshold)
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0
+        self.lock = Lock()
+
+    def backoff(self, attempt):
+        """ Returns the seconds to wait before the param retry attempt (from 0); between half and all of the delay """
+        delay = min(self.max_delay, self.base_delay * pow(2, attempt))
+        return uniform(delay / 2, delay)
+
+    def allow_call(self):
+        """ Returns whether calls can be made, i.e. the circuit breaker is not open """
+        return monotonic() >= self.open_until
+
+    def record_success(self):
+        """ Records a successful call, closing the circuit breaker """
+        with self.lock:
+            self.consecutive_failures = 0
+            self.trips = 0
+
+    def record_failure(self):
+        """ Records a failed call, opening the circuit breaker if too many calls in a row have failed """
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold and self.allow_call():
+                cooldown = self.backoff(self.trips)
+                self.trips += 1
+                self.open_until = monotonic() + cooldown
+                log_print("\rERROR:\t{} API calls in a row have failed due to network based errors"
+                          .format(self.consecutive_failures))
+                log_print("INFO:\tNo calls will be attempted for {:.0f} seconds".format(cooldown))
+
+
+class ApiKey:
+    """ A set of API credentials and the rate limit and call count kept for them """
+
+    def __init__(self, number, api_key, secret_key, calls_per_minute):
+        self.number = number
+        self.authorization = 'sso-key {}:{}'.format(api_key, secret_key)
+        self.rate_limiter = RateLimiter(calls_per_minute)
+        self.calls = 0
+
+
+class KeyPool:
+    """ Pool of API keys that API calls are spread across; each call is given to the next key (round-robin) that can
+    make a call the soonest, so a key that is rate limited or told to retry after does not hold up the others """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.next = 0
+        self.lock = Lock()
+
+    def acquire(self):
+        """ Blocks until one of the keys can make a call without exceeding its rate limit, then returns that key """
+        while True:
+            with self.lock:
+                waits = []
+                for i in range(len(self.keys)):
+                    key = self.keys[(self.next + i) % len(self.keys)]
+                    wait = key.rate_limiter.try_acquire()
+                    if wait <= 0:
+                        self.next = (key.number + 1) % len(self.keys)
+                        key.calls += 1
+                        return key
+                    waits.append(wait)
+            sleep(min(waits))
+            metrics.add("rate_limit_wait_seconds", min(waits))
+
+    def log_usage(self):
+        """ Logs the number of API calls made with each key """
+        for key in self.keys:
+            log_print("INFO:\tAPI calls made with key {}: {}".format(key.number + 1, key.calls), False)
+
+
+class StatusCache:
+    """ Persistent SQLite cache of domain statuses so that repeat runs can skip recently checked domains; each status
+    has its own time-to-live and 'Unknown' results are never cached """
+
+    def __init__(self, path, ttls, max_entries):
+        self.ttls = ttls  # seconds each status stays valid for
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)  # may be shared by shards
+        self.conn.execute("CREATE TABLE IF NOT EXISTS statuses "
+                          "(domain TEXT PRIMARY KEY, status TEXT NOT NULL, checked REAL NOT NULL) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS statuses_checked ON statuses (checked)")
+        self.conn.commit()
+        # an upper bound on the entries (replaced entries are counted as new), so they need only be counted again once
+        # it passes 'max_entries'
+        (self.count,) = self.conn.execute("SELECT COUNT(*) FROM statuses").fetchone()
+
+    def get_many(self, domains):
+        """ Returns a dict of each param domain (lowercase) with a fresh cached status; all others count as misses """
+        found = {}
+        now = time()
+        keys = [d.lower() for d in domains]
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i+500]
+                rows = self.conn.execute("SELECT domain, status, checked FROM statuses WHERE domain IN ({})"
+                                         .format(",".join("?" * len(chunk))), chunk)
+                for domain, status, checked in rows:
+                    if now - checked < self.ttls.get(status, 0):
+                        found[domain] = status
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, statuses):
+        """ Stores the param dict of domains and statuses, then evicts the oldest entries if over the size limit """
+        now = time()
+        rows = [(d.lower(), v, now) for d, v in statuses.items() if v in self.ttls]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO statuses VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+            self.count += len(rows)
+            if self.count > self.max_entries:
+                self.evict()
+
+    def evict(self):
+        """ Recounts the entries once the running count (which also counts replaced entries) passes 'max_entries',
+        removing the oldest down to 95% of it so that the entries are not counted again for a while """
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM statuses").fetchone()
+        target = max(1, self.max_entries * 95 // 100)
+        if count > target:  # even if not over the limit, so a cache kept full is not recounted on every put
+            self.conn.execute("DELETE FROM statuses WHERE domain IN "
+                              "(SELECT domain FROM statuses ORDER BY checked LIMIT ?)", (count - target,))
+            self.conn.commit()
+            count = target
+        self.count = count
+
+    def close(self):
+        """ Logs the cache statistics for the run and closes the database """
+        log_print("INFO:\tStatus cache hits: {}\tMisses: {}".format(self.hits, self.misses), False)
+        self.conn.close()
+
+
+class HistoryStore:
+    """ Persistent SQLite history of every domain's last checked status (as a status code), when it was last checked
+    and when it last changed (0 if it has not since it was first checked), plus a log of every change between
+    'Available' and 'Unavailable' """
+
+    def __init__(self, path):
+        self.lock = Lock()
+        self.changes = []  # changes found since last taken
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS history (domain TEXT PRIMARY KEY, status INTEGER NOT NULL, "
+                          "checked REAL NOT NULL, changed REAL NOT NULL) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS changes (domain TEXT NOT NULL, previous INTEGER NOT NULL, "
+                          "status INTEGER NOT NULL, time REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS changes_time ON changes (time)")
+        self.conn.commit()
+
+    def get_many(self, domains):
+        """ Returns a dict of each param domain (lowercase) in the history and its (status code, checked, changed) """
+        found = {}
+        keys = [d.lower() for d in domains]
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i+500]
+                rows = self.conn.execute("SELECT domain, status, checked, changed FROM history WHERE domain IN ({})"
+                                         .format(",".join("?" * len(chunk))), chunk)
+                for domain, status, checked, changed in rows:
+                    found[domain] = (status, checked, changed)
+        return found
+
+    def record(self, statuses):
+        """ Records the param dict of domains and statuses, noting any that have changed since they were last checked;
+        'Unknown' statuses are not recorded """
+        now = time()
+        statuses = {d.lower(): STATUS_CODES[v] for d, v in statuses.items() if v != "Unknown"}
+        previous = self.get_many(statuses)
+        rows = []
+        changes = []
+        for domain, status in statuses.items():
+            # a domain checked for the first time has not changed, so is not counted as having changed recently
+            old_status, checked, changed = previous.get(domain, (status, now, 0))
+            if old_status != status:
+                changed = now
+                changes.append((domain, old_status, status, now))
+                self.changes.append((domain, STATUS_LABELS[old_status], STATUS_LABELS[status], checked))
+            rows.append((domain, status, now, changed))
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)", rows)
+            self.conn.executemany("INSERT INTO changes VALUES (?, ?, ?, ?)", changes)
+            self.conn.commit()
+
+    def take_changes(self):
+        """ Returns the (domain, previous status, status, previously checked) changes found since last taken """
+        with self.lock:
+            changes, self.changes = self.changes, []
+        return changes
+
+    def close(self):
+        """ Closes the database """
+        self.conn.close()
+
+
+class Checkpoint:
+    """ Append-only journal of the statuses found during a search, so that a crashed or killed search can be resumed
+    without repeating the API calls already made """
+
+    def __init__(self, name):
+        self.path = "checkpoints/" + name.replace("/", "_") + ".journal"
+        self.file = None
+
+    def load(self):
+        """ Opens the journal for writing; returns the statuses already recorded in it if resuming """
+        statuses = {}
+        needs_newline = False
+        if resume and isfile(self.path):
+            with open(self.path, "rb") as journal:
+                # read a line at a time, as the journal of a large search may not fit in memory
+                for row in csv.reader((line.decode() for line in journal), delimiter='\t', quoting=csv.QUOTE_NONE):
+                    # a record cut off by a crash is ignored and so will be rechecked
+                    if len(row) == 3 and row[1] in STATUS_CODES:
+                        statuses[row[0]] = row[1]
+                if journal.tell() > 0:
+                    journal.seek(-1, 2)
+                    needs_newline = journal.read(1) != b"\n"
+            log_print("INFO:\tResuming search with {} domains already checked".format(len(statuses)))
+        self.file = open(self.path, "a" if resume else "w", newline='')
+        if needs_newline:
+            self.file.write("\n")
+        return statuses
+
+    def record(self, statuses):
+        """ Appends the param dict of domains and statuses to the journal """
+        timestamp = strftime("%Y-%m-%dT%H:%M:%S")
+        for domain, status in statuses.items():
+            self.file.write(domain + "\t" + status + "\t" + timestamp + "\n")
+        self.file.flush()
+
+    def clear(self):
+        """ Removes the journal once its search has been exported """
+        self.file.close()
+        if isfile(self.path):
+            remove(self.path)
+
+
+class PreFilter:
+    """ Finds domains that are certainly registered -- those delegated in a local zone file dump, or with NS records
+    when looked up through a DNS resolver -- so that they can be marked unavailable without using any API calls """
+
+    def __init__(self, zone_files, resolver, port, timeout, concurrency):
+        self.zone = numpy.empty(0, dtype=numpy.uint64)  # sorted hashes of the domains delegated in the zone files
+        for path in zone_files:
+            self.load_zone(path)
+        self.resolver = None
+        if resolver:
+            family, _, _, _, address = socket.getaddrinfo(resolver, port, type=socket.SOCK_DGRAM)[0]
+            self.resolver = (family, address)
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+
+    @staticmethod
+    def hash(domain):
+        """ Helper function for the 64 bit hash of a domain; stored in place of the domain to keep the zone compact """
+        return int.from_bytes(blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+    def load_zone(self, path):
+        """ Adds the domains delegated (given NS records) in the param zone file to the zone; a plain list of domains,
+        one per line, is also accepted """
+        log_print("INFO:\tLoading pre-filter zone file: " + path)
+        hashes = [self.zone]
+        batch = []
+        origin = ""
+        owner = ""
+        with open(path, encoding="ascii", errors="ignore") as zone_file:
+            for line in zone_file:
+                fields = line.split(";", 1)[0].split()
+                if not fields:
+                    continue
+                if fields[0].upper() == "$ORIGIN" and len(fields) > 1:
+                    origin = fields[1].lower().rstrip(".")
+                    continue
+                if fields[0].startswith("$"):
+                    continue
+                if not line[0].isspace():  # otherwise the record belongs to the previous owner
+                    owner = fields.pop(0).lower()
+                    if owner == "@":
+                        owner = origin
+                    elif owner.endswith("."):
+                        owner = owner.rstrip(".")
+                    elif origin:
+                        owner += "." + origin
+                    if not fields:
+                        batch.append(self.hash(owner))
+                # the record type follows the optional TTL and class
+                if any(field.upper() == "NS" for field in fields[:3]):
+                    batch.append(self.hash(owner))
+                if len(batch) >= 1000000:
+                    hashes.append(numpy.array(batch, dtype=numpy.uint64))
+                    batch = []
+        hashes.append(numpy.array(batch, dtype=numpy.uint64))
+        self.zone = numpy.unique(numpy.concatenate(hashes))
+        log_print("INFO:\tPre-filter zone now holds {} domains".format(len(self.zone)))
+
+    def filter(self, domains):
+        """ Returns a dict of the param domains found to be registered (lowercase) and their pre-filter status """
+        found = []
+        if len(self.zone) and domains:
+            hashes = numpy.fromiter((self.hash(d.lower()) for d in domains), dtype=numpy.uint64, count=len(domains))
+            positions = numpy.minimum(numpy.searchsorted(self.zone, hashes), len(self.zone) - 1)
+            found = [d for d, hit in zip(domains, (self.zone[positions] == hashes).tolist()) if hit]
+        if self.resolver:
+            found_set = set(found)
+            remaining = [d for d in domains if d not in found_set]
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                found += [d for d, delegated in zip(remaining, executor.map(self.is_delegated, remaining)) if delegated]
+        return {d.lower(): "Unavailable (pre-filter)" for d in found}
+
+    def is_delegated(self, domain):
+        """ Looks up the NS records of the param domain; only returns True if the resolver answers with some, so that
+        any error, timeout or empty answer leaves the domain to be checked through the API """
+        query_id = randrange(65536)
+        question = b"".join(bytes([len(label)]) + label.encode() for label in domain.lower().split(".")) + b"\0"
+        query = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0) + question + struct.pack("!HH", 2, 1)
+        try:
+            with socket.socket(self.resolver[0], socket.SOCK_DGRAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.sendto(query, self.resolver[1])
+                response = sock.recv(4096)
+                while response[:2] != query[:2]:  # ignore any late answers to other queries
+                    response = sock.recv(4096)
+        except OSError:
+            return False
+        if len(response) < 12 or response[12:12 + len(question)].lower() != question:
+            return False
+        flags, questions, answers = struct.unpack("!HHH", response[2:8])
+        return bool(flags & 0x8000) and flags & 0x000F == 0 and answers > 0
+
+
+class TldRegistry:
+    """ The TLDs known to the API and their metadata (type and whether they are supported), loaded once from the
+    'all_tlds.csv' file that caches them; the cache is refreshed from the API (conditionally, if an ETag was given)
+    once it is older than the refresh age """
+
+    def __init__(self, path, refresh_days):
+        self.path = path
+        self.etag_path = path + ".etag"
+        self.refresh_seconds = refresh_days * 86400
+        self.tlds = {}  # TLD: (type, supported)
+        if isfile(path):
+            with open(path, newline='') as tld_file:
+                for row in csv.reader(tld_file):
+                    if row and row[0] != "TLD":  # older caches have no header, type or supported columns
+                        self.tlds[normalise_domain(row[0])] = (row[1] if len(row) > 1 else "",
+                                                                len(row) < 3 or row[2] == "true")
+        self.supported_tlds = self.find_supported()
+
+    def find_supported(self):
+        """ Returns the set of supported TLDs, or None if no TLDs are known (so TLDs cannot be checked against it) """
+        return frozenset(tld for tld, (kind, supported) in self.tlds.items() if supported) if self.tlds else None
+
+    def supported(self):
+        """ Returns the set of supported TLDs (cached until the TLDs are next refreshed), or None if none are known """
+        return self.supported_tlds
+
+    def is_supported(self, domain):
+        """ Checks if the param (normalised) domain ends with a supported TLD; always True if no TLDs are known """
+        supported = self.supported()
+        labels = domain.split(".")
+        return supported is None or any("." + ".".join(labels[i:]) in supported for i in range(1, len(labels)))
+
+    def refresh(self, force=False):
+        """ Refreshes the cached TLDs from the API if forced or the cache is older than the refresh age; TLDs no
+        longer returned by the API are kept but marked unsupported """
+        if not force and self.tlds and time() - getmtime(self.path) < self.refresh_seconds:
+            return
+        log_print("INFO:\tUpdating list of all valid TLDs")
+        headers = {}
+        if self.tlds and isfile(self.etag_path):
+            with open(self.etag_path) as etag_file:
+                headers["If-None-Match"] = etag_file.read().strip()
+        try:
+            key = key_pool.acquire()
+            response = timed_call(session.get, key, 0, headers, url=api_url("/v1/domains/tlds"), timeout=30)
+            json = response.json() if response.status_code != 304 else None
+        except (exceptions.RequestException, ValueError):
+            log_print("ERROR:\tValid TLDs could not be updated due to a network based error")
+            return
+        if response.status_code == 304:
+            utime(self.path)  # restarts the cache's age
+            log_print("INFO:\tValid TLDs list is already up to date")
+            return
+        if not isinstance(json, list):
+            if isinstance(json, dict):
+                log_print("ERROR:\t" + str(json.get("code")) + "\tMessage: " + str(json.get("message")))
+            log_print("INFO:\tValid TLDs could not be updated")
+            return
+        tlds = {normalise_domain("." + x["name"]): (x.get("type", ""), True) for x in json if "name" in x}
+        for tld, (kind, supported) in self.tlds.items():
+            if tld not in tlds:
+                tlds[tld] = (kind, False)
+        self.tlds = tlds
+        self.supported_tlds = self.find_supported()
+        # written in one go to a temporary file which then replaces the cache, so a crash cannot leave it half written
+        lines = ["TLD,Type,Supported"] + [tld + "," + kind + "," + ("true" if supported else "false")
+                                          for tld, (kind, supported) in sorted(tlds.items())]
+        with open(self.path + ".tmp", "w", newline='') as tld_file:
+            tld_file.write("\n".join(lines) + "\n")
+        replace(self.path + ".tmp", self.path)
+        if response.headers.get("ETag"):
+            with open(self.etag_path, "w") as etag_file:
+                etag_file.write(response.headers["ETag"])
+        log_print("INFO:\tValid TLDs list had been updated ({} supported)".format(len(self.supported() or ())))
+
+
+class NameScorer:
+    """ Scores how valuable a domain is likely to be from its name, so that the most valuable domains can be checked
+    first: dictionary words (or two joined together), how pronounceable it is (how likely its letter pairs are in the
+    dictionary's words, or if no dictionary is given, how well it alternates vowels and consonants and how common its
+    letters are), not having digits or hyphens, and its TLD's place in the list of priority TLDs. Each is weighted by
+    the param weights """
+
+    def __init__(self, dictionary_path, weights, priority_tlds):
+        self.words = set()
+        self.bigrams = {}  # log likelihood of each letter pair, with "^" and "$" marking the start and end of words
+        self.unseen_bigram = 0
+        if dictionary_path:
+            with open(dictionary_path, encoding="utf-8", errors="ignore") as dictionary_file:
+                self.words = {word for word in (line.strip().lower() for line in dictionary_file)
+                              if word.isascii() and word.isalpha()}
+            counts = {}
+            for word in self.words:
+                word = "^" + word + "$"
+                for pair in zip(word, word[1:]):
+                    counts[pair] = counts.get(pair, 0) + 1
+            total = sum(counts.values()) + 28 * 28  # add-one smoothing over the 26 letters, start and end
+            self.bigrams = {pair: log((count + 1) / total) for pair, count in counts.items()}
+            self.unseen_bigram = log(1 / total)
+            log_print("INFO:\tLoaded {} dictionary words for scoring".format(len(self.words)))
+        self.weights = {"dictionary": 10, "pronounceable": 4, "plain": 2, "tld": 3, **weights}
+        self.tld_scores = {normalise_domain(tld): 1 - i / len(priority_tlds) for i, tld in enumerate(priority_tlds)}
+
+    def score_root(self, root):
+        """ Returns the score of the param root domain """
+        score = self.weights["pronounceable"] * self.pronounceability(root)
+        if root in self.words:
+            score += self.weights["dictionary"]
+        elif any(root[:i] in self.words and root[i:] in self.words for i in range(2, len(root) - 1)):
+            score += self.weights["dictionary"] / 2
+        if root.isalpha():
+            score += self.weights["plain"]
+        else:
+            score -= self.weights["plain"] * sum(not c.isalpha() for c in root)
+        return score
+
+    def score_tld(self, tld):
+        """ Returns the score of the param TLD """
+        return self.weights["tld"] * self.tld_scores.get(tld.lower(), 0)
+
+    def pronounceability(self, root):
+        """ Returns how pronounceable the param root domain is, from 0 to 1 """
+        if not root.isalpha():
+            return 0
+        if self.bigrams:
+            word = "^" + root + "$"
+            mean = sum(self.bigrams.get(pair, self.unseen_bigram) for pair in zip(word, word[1:])) / (len(word) - 1)
+            return 1 - mean / self.unseen_bigram  # unseen pairs score 0, while the likeliest approach 1
+        # without a dictionary, favour names that alternate vowels and consonants, penalising names without vowels and
+        # runs of three or more (each letter past the second counting against it), and names with rare letters; 'y'
+        # is a vowel only when it follows a consonant
+        vowels = [c in "aeiou" or (c == "y" and i > 0 and root[i - 1] not in "aeiou") for i, c in enumerate(root)]
+        rarest = log(min(LETTER_FREQUENCIES.values()))
+        commonness = sum(log(LETTER_FREQUENCIES[c]) - rarest for c in root) / (
+            len(root) * (log(max(LETTER_FREQUENCIES.values())) - rarest))
+        structure = 0
+        if any(vowels):
+            excess = 0
+            run = 1
+            for prev, vowel in zip(vowels, vowels[1:]):
+                run = run + 1 if prev == vowel else 1
+                excess += run >= 3
+            alternation = sum(prev != vowel for prev, vowel in zip(vowels, vowels[1:])) / max(len(root) - 1, 1)
+            structure = (1 - excess / len(root)) * (0.75 + 0.25 * alternation)
+        return 0.8 * structure * (0.5 + 0.5 * commonness) + 0.2 * commonness
+
+
+class LookupService:
+    """ The lookups of the service mode: domains without a fresh cached status are queued, and a worker thread checks
+    them in batches through the same (rate limited) path as the searches, so that lookups share the API budget with
+    any background searches. Bulk lookups are submitted as jobs whose progress can be polled """
+
+    def __init__(self, batch_wait, job_ttl):
+        self.batch_wait = batch_wait
+        self.job_ttl = job_ttl
+        self.started = monotonic()
+        self.pending = {}  # domain: Future of its status, in the order queued
+        self.jobs = {}  # job id: (time submitted, dict of domains and their status or Future, rejected domains)
+        self.next_job = 1
+        self.searching = False
+        self.failed_batches = 0
+        self.worker_restarts = 0
+        self.lock = Lock()
+        self.ready = Event()
+        self.worker = Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    def check_worker(self):
+        """ Restarts the worker thread if it has stopped; returns whether it was running """
+        with self.lock:
+            if self.worker.is_alive():
+                return True
+            log_print("ERROR:\tThe lookup worker had stopped and has been restarted")
+            self.worker_restarts += 1
+            self.worker = Thread(target=self.work, daemon=True)
+            self.worker.start()
+            return False
+
+    def lookup(self, domains):
+        """ Returns a dict of each valid param domain (normalised) and its cached status or the Future of its status,
+        and a dict of the invalid domains and why they were rejected """
+        statuses = {}
+        rejected = {}
+        for domain in domains:
+            normalised = normalise_domain(domain) if isinstance(domain, str) else None
+            if not normalised or "." not in normalised or not is_valid_domain(normalised):
+                rejected[str(domain)] = "invalid"
+            elif not tld_registry.is_supported(normalised):
+                rejected[str(domain)] = "not supported by the API"
+            else:
+                statuses[normalised] = None
+        if status_cache:
+            statuses.update(status_cache.get_many(statuses))
+        misses = [domain for domain, status in statuses.items() if status is None]
+        self.check_worker()
+        with self.lock:
+            for domain in misses:
+                if domain not in self.pending:
+                    self.pending[domain] = Future()
+                statuses[domain] = self.pending[domain]
+        if misses:
+            self.ready.set()
+        return statuses, rejected
+
+    def submit(self, domains):
+        """ Submits a bulk lookup of the param domains as a job; returns its id """
+        statuses, rejected = self.lookup(domains)
+        with self.lock:
+            now = monotonic()
+            for job_id in [job_id for job_id, job in self.jobs.items() if now - job[0] > self.job_ttl]:
+                del self.jobs[job_id]
+            job_id = self.next_job
+            self.next_job += 1
+            self.jobs[job_id] = (now, statuses, rejected)
+        return job_id
+
+    def job(self, job_id):
+        """ Returns the progress of the param job (None if there is no such job): its statuses so far (None if still
+        pending) and rejected domains """
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        statuses = {}
+        for domain, status in job[1].items():
+            if isinstance(status, Future):
+                status = status.result() if status.done() else None
+            statuses[domain] = status
+        return {"job": job_id, "done": None not in statuses.values(), "statuses": statuses, "rejected": job[2]}
+
+    def health(self):
+        """ Returns the health of the service """
+        worker_alive = self.check_worker()
+        with self.lock:
+            queued = len(self.pending)
+            jobs = len(self.jobs)
+        if not worker_alive:
+            status = "worker_restarted"
+        elif not retry_policy.allow_call():
+            status = "circuit_open"
+        else:
+            status = "ok"
+        return {"status": status, "uptime": round(monotonic() - self.started), "queued": queued, "jobs": jobs,
+                "worker_alive": worker_alive, "worker_restarts": self.worker_restarts,
+                "failed_batches": self.failed_batches, "searching": self.searching, "keys": len(key_pool.keys)}
+
+    def work(self):
+        """ Checks the queued domains in batches, first waiting briefly so that bursts of lookups share calls """
+        while True:
+            self.ready.wait()
+            sleep(self.batch_wait)
+            with self.lock:
+                batch = list(islice(self.pending, (bulk_size if bulk_search else 1) * concurrent_requests))
+                if len(batch) == len(self.pending):
+                    self.ready.clear()
+            statuses = {}
+            try:
+                if pre_filter:
+                    with metrics.timer("prefilter_seconds"):
+                        statuses.update(pre_filter.filter(batch))
+                check_with_retries([domain for domain in batch if domain not in statuses],
+                                   lambda new_statuses: record_statuses(statuses, new_statuses))
+                metrics.add("domains_checked", len(batch))
+            except BaseException as error:  # incl. the exit() on a malformed response; the worker must keep going
+                self.failed_batches += 1
+                log_print("ERROR:\tA batch of {} lookups could not be checked ({}) and has been marked Unknown"
+                          .format(len(batch), repr(error)))
+            finally:
+                with self.lock:
+                    for domain in batch:
+                        self.pending.pop(domain).set_result(statuses.get(domain, "Unknown"))
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """ The local HTTP/JSON API of the service mode:
+            GET  /lookup?domain=example.com     status of a domain, waiting up to 'daemon_lookup_timeout' if queued
+            POST /lookup  ["a.com", "b.net"]    submits a bulk lookup job; returns its id and any cached statuses
+            GET  /jobs/<id>                     progress of a bulk lookup job
+            GET  /health, GET /metrics """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # every request would otherwise be printed
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match url.path.rstrip("/").split("/")[1:]:
+            case ["health"]:
+                self.send_json(200, lookup_service.health())
+            case ["metrics"]:
+                self.send_json(200, metrics.snapshot())
+            case ["lookup"]:
+                domain = parse_qs(url.query).get("domain", [""])[0]
+                statuses, rejected = lookup_service.lookup([domain])
+                if rejected:
+                    self.send_json(400, {"domain": domain, "error": rejected[domain]})
+                    return
+                domain, status = next(iter(statuses.items()))
+                if isinstance(status, Future):
+                    wait([status], timeout=daemon_lookup_timeout)
+                    if not status.done():  # still queued; it can be looked up again later
+                        self.send_json(202, {"domain": domain, "status": None})
+                        return
+                    status = status.result()
+                self.send_json(200, {"domain": domain, "status": status})
+            case ["jobs", job_id] if job_id.isdigit():
+                job = lookup_service.job(int(job_id))
+                self.send_json(200 if job else 404, job or {"error": "no such job"})
+            case _:
+                self.send_json(404, {"error": "unknown path"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path.rstrip("/") != "/lookup":
+            self.send_json(404, {"error": "unknown path"})
+            return
+        try:
+            domains = loads(body)
+        except ValueError:
+            domains = None
+        if isinstance(domains, dict):
+            domains = domains.get("domains")
+        if not isinstance(domains, list):
+            self.send_json(400, {"error": "body must be a JSON list of domains"})
+            return
+        self.send_json(202, lookup_service.job(lookup_service.submit(domains)))
+
+    def send_json(self, code, body):
+        """ Sends the param body as a JSON response """
+        data = dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class GeneralRoots:
+    """ Lazy, range-like sequence of every domain-valid root of the given length with a general value between the
+    given bounds (inclusive), in order of value. Roots are worked out arithmetically from their position, so invalid
+    strings (leading, trailing or double hyphens) are skipped over rather than generated and then filtered """
+
+    def __init__(self, length, min_val, max_val):
+        self.length = length
+        # completions[n][h] is the number of valid endings n chars long, where h is if the previous char was a '-'
+        self.completions = [[1, 1], [36, 36]]
+        for n in range(2, length + 1):
+            prev = self.completions[n - 1]
+            self.completions.append([36 * prev[0] + prev[1], 36 * prev[0]])
+        self.start = self.count_upto(max(min_val, 0) - 1)
+        self.stop = max(self.start, self.count_upto(min(max_val, pow(37, length) - 1)))
+
+    def word(self, value):
+        """ Returns the string (of the sequence's length) with the param general value """
+        chars = []
+        for i in range(self.length):
+            value, v = divmod(value, 37)
+            chars.append(possible_vals[v])
+        return "".join(reversed(chars))
+
+    def count_upto(self, value):
+        """ Returns the number of valid roots with a general value less than or equal to the param value """
+        if value < 0:
+            return 0
+        count = 0
+        prev_hyphen = False
+        for i, c in enumerate(self.word(value)):
+            # every char before c is a letter or digit, so each is followed by the same number of valid endings
+            count += possible_vals.index(c) * self.completions[self.length - i - 1][0]
+            if c == '-' and (i == 0 or i == self.length - 1 or prev_hyphen):
+                return count  # the value's own string is invalid, so no more valid roots can be below it
+            prev_hyphen = c == '-'
+        return count + 1
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):  # a slice of the sequence is the sequence between the values at its ends
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("GeneralRoots slices must have a step of 1")
+            if stop <= start:
+                return GeneralRoots(self.length, 1, 0)
+            return GeneralRoots(self.length, get_general_value(self[start]), get_general_value(self[stop - 1]))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("GeneralRoots index out of range")
+        index += self.start
+        chars = []
+        for i in range(self.length):
+            block = self.completions[self.length - i - 1][0]
+            if index < 36 * block:
+                chars.append(possible_vals[index // block])
+                index %= block
+            else:
+                chars.append('-')
+                index -= 36 * block
+        return "".join(chars)
+
+    def __iter__(self):
+        if len(self):
+            yield from self.iter_from("", self[0], self[-1], True, True)
+
+    def iter_from(self, prefix, low, high, tight_low, tight_high):
+        """ Yields the valid roots beginning with the param prefix that lie between the low and high roots; the tight
+        flags are whether the prefix is still equal to the start of the respective bound """
+        pos = len(prefix)
+        first = possible_vals.index(low[pos]) if tight_low else 0
+        last = possible_vals.index(high[pos]) if tight_high else 36
+        if pos == 0 or pos == self.length - 1 or prefix[-1] == '-':
+            last = min(last, 35)
+        if pos == self.length - 1:
+            for c in possible_vals[first:last + 1]:
+                yield prefix + c
+        else:
+            for c in possible_vals[first:last + 1]:
+                yield from self.iter_from(prefix + c, low, high,
+                                          tight_low and c == low[pos], tight_high and c == high[pos])
+
+
+def export_results(rows, top_level_domains, filename):
+    """ Exports the rows of root domains and their status codes to an excel spreadsheet (or csv); rows are written as
+    they are received so that memory use does not grow with the size of the search """
+    with metrics.timer("export_seconds"):  # less the time spent getting the rows
+        rows = metrics.excluding(rows, "export_seconds")
+        try:
+            if export_format == "csv":
+                with open(filepath + filename + ".csv", "w", newline='') as csv_file:
+                    writer = csv.writer(csv_file)
+                    writer.writerow([""] + top_level_domains)
+                    for root, codes in rows:
+                        writer.writerow([root] + [STATUS_LABELS[code] for code in codes.tolist()])
+            else:
+                # Setup workbook and sheet; constant memory mode flushes each row to disk once the next row is started
+                with xlsxwriter.Workbook(filepath + filename + ".xlsx", {'constant_memory': True}) as workbook:
+                    header_form = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+                    avail_form = workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})
+                    unavail_form = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
+                    max_col = len(top_level_domains)
+
+                    def add_sheet():
+                        """ Adds a sheet with the TLDs as its header """
+                        new_sheet = workbook.add_worksheet("Sheet" + str(len(workbook.worksheets()) + 1))
+                        new_sheet.set_column(0, max_col, 10)
+                        new_sheet.freeze_panes(1, 1)
+                        new_sheet.write_row(0, 1, top_level_domains, header_form)
+                        return new_sheet
+
+                    def format_sheet(full_sheet, max_row):
+                        """ Adds the conditional formatting of the statuses to a sheet once its rows are written """
+                        for label, form in (("Available", avail_form), ("Unavailable", unavail_form),
+                                            ("Unavailable (pre-filter)", unavail_form)):
+                            full_sheet.conditional_format(1, 1, max_row, max_col,
+                                                          {'type': 'cell',
+                                                           'criteria': 'equal to',
+                                                           'value': '"' + label + '"',
+                                                           'format': form})
+
+                    sheet = add_sheet()
+                    max_row = 0
+                    for root, codes in rows:
+                        max_row += 1
+                        if max_row == EXCEL_MAX_ROWS:  # this sheet is full, so continue on a new one
+                            format_sheet(sheet, max_row - 1)
+                            sheet = add_sheet()
+                            max_row = 1
+                            log_print("\rINFO:\tResults exceed the rows of an excel sheet, continuing on " +
+                                      sheet.get_name())
+                        if sheet.write_string(max_row, 0, root, header_form) < 0 or \
+                                sheet.write_row(max_row, 1, [STATUS_LABELS[code] for code in codes.tolist()]) < 0:
+                            log_print("ERROR:\tResults could not be written to the excel export")
+                            log_print("STATUS:\tAborting due to above error")
+                            exit(1)
+                    format_sheet(sheet, max_row)
+        except (OSError, xlsxwriter.exceptions.FileCreateError):
+            log_print("ERROR:\tFile export location/path is invalid")
+            log_print("STATUS:\tAborting due to above error")
+            exit(1)
 
 
 def get_status(string):
-    """ Gets the status of the param domain string (root + tld) """
-    headers = {'Accept': 'application/json', 'Content-Type': 'application/json',
-               'Authorization': 'sso-key {}:{}'.format(api_key, secret_key)}
-    url = "https://" + api_domain + "/v1/domains/available"
+    """ Gets the status of the param domain string (root + tld); returns None if the call failed due to a network based
+    error (or the circuit breaker is open) so that it can be retried later """
+    url = api_url("/v1/domains/available")
+    while True:
+        if not retry_policy.allow_call():
+            return None
+        try:
+            key = key_pool.acquire()
+            response = timed_call(session.get, key, 1, url=url, params={'domain': string, 'checkType': 'FULL'},
+                                  timeout=10)
+            if response.status_code >= 500:  # server side errors are treated like network ones and retried
+                raise exceptions.HTTPError(response=response)
+            json = response.json()
+        except exceptions.RequestException:
+            retry_policy.record_failure()
+            return None
+        retry_policy.record_success()
+        try:
+            if "available" in json:
+                match json["available"]:
+                    case True:
+                        return "Available"
+                    case False:
+                        return "Unavailable"
+            else:
+                match json["code"]:
+                    case "TOO_MANY_REQUESTS":
+                        log_print("INFO:\tAPI call limit exceeded for key {}. Pausing it for {} seconds"
+                                  .format(key.number + 1, json["retryAfterSec"]), False)
+                        key.rate_limiter.pause(json["retryAfterSec"])
+                        metrics.add("retry_after_seconds", json["retryAfterSec"])
+                        metrics.event("throttled", key=key.number, retry_after=json["retryAfterSec"])
+                    # case "401":  # String equivalent unknown, so has been commented out
+                    #     log_print("ERROR:\tAPI Authentication Error (Invalid)")
+                    #     log_print("INFO:\tAborting due to above error")
+                    #     exit(1)
+                    # case "403":  # String equivalent unknown, so has been commented out
+                    #     log_print("ERROR:\tAPI Authentication Error (No Access)")
+                    #     log_print("INFO:\tAborting due to above error")
+                    #     exit(1)
+                    case _:
+                        log_print("ERROR:\tAPI Error for domain: \"" + string + "\"", False)
+                        log_print("\t\tError Code: " + json["code"] + "\tMessage: " + json["message"], False)
+                        return "Unknown"
+        except KeyError:
+            log_print("ERROR:\tAPI Response Error when conducting search")
+            log_print("STATUS:\tAborting due to above error")
+            exit(1)
+
+
+def timed_call(call, key, domains, headers=None, **kwargs):
+    """ Helper function that makes the param API call with the param key (and any extra headers), recording its
+    latency and outcome """
+    started = monotonic()
     try:
-        response = get(url, params={'domain': string, 'checkType': 'FULL'}, headers=headers, timeout=10)
-        json = response.json()
+        response = call(headers={'Authorization': key.authorization, **(headers or {})}, **kwargs)
     except exceptions.RequestException:
-        count = globals()['net_attempt_counts']
-        if count == 0:
-            print("\r", sep="", end="")
-        if count < 5:
-            sleep_len = 20*(count+1)
-            log_print("ERROR:\tNetwork based error has occurred while getting status")
-            log_print("INFO:\tWill reattempt in {} seconds. Attempt {}".format(sleep_len, count+1), to_print=False)
-            sleep(5)
-            globals()['net_attempt_counts'] += 1
-            return get_status(string)
-        else:
-            log_print("STATUS:\t{} failed attempts have occurred. Program paused.".format(count))
-            junk = input("Please check network connectivity and the press enter to continue:")
-            log_print("INFO:\tUser input provided. Retrying get request.")
-            return get_status(string)
-    try:
-        globals()['net_attempt_counts'] = 0
-        if "available" in json:
-            match json["available"]:
-                case True:
-                    return "Available"
-                case False:
-                    return "Unavailable"
-        else:
+        metrics.record_request(monotonic() - started, domains, key.number + 1, "network_error")
+        raise
+    metrics.record_request(monotonic() - started, domains, key.number + 1, response.status_code)
+    return response
+
+
+def get_single_status(string):
+    """ Gets the status of the param domain string, using the cached status if it is still fresh """
+    if status_cache:
+        cached = status_cache.get_many([string])
+        if cached:
+            return cached[string.lower()]
+    status = get_status(string)
+    attempt = 0
+    while status is None and attempt < retry_policy.max_retries:
+        delay = retry_policy.backoff(attempt)
+        log_print("INFO:\tNetwork based error has occurred. Will reattempt in {:.0f} seconds".format(delay))
+        sleep(delay)
+        attempt += 1
+        status = get_status(string)
+    if status is None:
+        return "Unknown"
+    record_statuses({}, {string.lower(): status})
+    return status
+
+
+def get_bulk_status(strings):
+    """ Gets the statuses of a batch of domain strings (root + tld) using a single call to the bulk availability
+    endpoint; returns a dict of each (lowercase) domain and its status. Domains left out of the dict could not be
+    checked due to a network based error (or the circuit breaker being open) and can be retried later """
+    url = api_url("/v1/domains/available")
+    while True:
+        if not retry_policy.allow_call():
+            return {}
+        try:
+            key = key_pool.acquire()
+            response = timed_call(session.post, key, len(strings), url=url, params={'checkType': 'FULL'},
+                                  json=strings, timeout=60)
+            if response.status_code >= 500:  # server side errors are treated like network ones and retried
+                raise exceptions.HTTPError(response=response)
+            json = response.json()
+        except exceptions.RequestException:
+            retry_policy.record_failure()
+            return {}
+        retry_policy.record_success()
+        try:
+            statuses = {}
+            if "domains" in json or "errors" in json:
+                for result in json.get("domains", []):
+                    statuses[result["domain"].lower()] = "Available" if result["available"] else "Unavailable"
+                for error in json.get("errors", []):  # errors for individual domains within the batch
+                    log_print("ERROR:\tAPI Error for domain: \"" + error["domain"] + "\"", False)
+                    log_print("\t\tError Code: " + error["code"] + "\tMessage: " + error.get("message", ""), False)
+                    statuses[error["domain"].lower()] = "Unknown"
+                for string in strings:  # any domain missing from the response could not be determined
+                    statuses.setdefault(string.lower(), "Unknown")
+                return statuses
             match json["code"]:
                 case "TOO_MANY_REQUESTS":
-                    log_print("INFO:\tAPI call limit exceeded. Sleeping {} seconds".format(json["retryAfterSec"]),
-                              False)
-                    sleep(json["retryAfterSec"])
-                    globals()['cpm_t0'] = time()
-                    return get_status(string)
-                # case "401":  # String equivalent unknown, so has been commented out
-                #     log_print("ERROR:\tAPI Authentication Error (Invalid)")
-                #     log_print("INFO:\tAborting due to above error")
-                #     exit(1)
-                # case "403":  # String equivalent unknown, so has been commented out
-                #     log_print("ERROR:\tAPI Authentication Error (No Access)")
-                #     log_print("INFO:\tAborting due to above error")
-                #     exit(1)
+                    log_print("INFO:\tAPI call limit exceeded for key {}. Pausing it for {} seconds"
+                              .format(key.number + 1, json["retryAfterSec"]), False)
+                    key.rate_limiter.pause(json["retryAfterSec"])
+                    metrics.add("retry_after_seconds", json["retryAfterSec"])
+                    metrics.event("throttled", key=key.number, retry_after=json["retryAfterSec"])
                 case _:
-                    log_print("ERROR:\tAPI Error for domain: \"" + string + "\"", False)
-                    log_print("\t\tError Code: " + json["code"] + "\tMessage: " + json["message"], False)
-                    return "Unknown"
-    except KeyError:
-        log_print("ERROR:\tAPI Response Error when conducting search")
-        log_print("STATUS:\tAborting due to above error")
-        exit(1)
+                    if len(strings) == 1:
+                        log_print("ERROR:\tAPI Error for domain: \"" + strings[0] + "\"", False)
+                        log_print("\t\tError Code: " + json["code"] + "\tMessage: " + json["message"], False)
+                        return {strings[0].lower(): "Unknown"}
+                    if response.status_code != 422:  # e.g. authentication errors, which splitting would only repeat
+                        log_print("ERROR:\tAPI Error for batch of {} domains".format(len(strings)), False)
+                        log_print("\t\tError Code: " + json["code"] + "\tMessage: " + json["message"], False)
+                        return {string.lower(): "Unknown" for string in strings}
+                    # one bad entry fails validation of the whole batch, so split it to isolate the offending domain
+                    log_print("INFO:\tAPI Error for batch of {} domains (Code: {}). Splitting batch"
+                              .format(len(strings), json["code"]), False)
+                    half = len(strings) // 2
+                    statuses.update(get_bulk_status(strings[:half]))
+                    statuses.update(get_bulk_status(strings[half:]))
+                    return statuses
+        except KeyError:
+            log_print("ERROR:\tAPI Response Error when conducting search")
+            log_print("STATUS:\tAborting due to above error")
+            exit(1)
 
 
-def get_data(top_level_domains, root_domains):
-    """ Checks the availability [calls the get_status() function] of each instance in the cartesian product of the
-    root and TLD sets """
-    data = {}
-    globals()['cpm_t0'] = time()
-    req_counter = 0
-    load_counter = 0
-    for top in top_level_domains:
-        vals = []
-        for root in root_domains:
-            url = root + top
-            vals.append(get_status(url))
-            req_counter += 1
-            if req_counter % 5 == 0:  # Display loading text to indicate script has not frozen
-                load_str = "Loading "
-                match (load_counter % 4):
-                    case 0:
-                        load_str += "\\"
-                    case 1:
-                        load_str += "|"
-                    case 2:
-                        load_str += "/"
-                    case 3:
-                        load_str += "\u2015"
-                print("\r", load_str, sep="", end="")
-                load_counter += 1
-            if calls_per_min > 0 and req_counter % calls_per_min == 0:  # Ensure not to exceed API limit
-                if time() - globals()['cpm_t0'] < 60:
-                    sleep(60 - (time() - globals()['cpm_t0']))
-                globals()['cpm_t0'] = time()
-        for j in range(len(root_domains)):
-            data.update({top: vals})
-    log_print("\rINFO:\tSearch Complete")
-    return data
-
-
-def get_all_valid_tlds():
-    """ Function to get all TLDs supported by the API; is largely unneeded after first run to create output """
-    log_print("INFO:\tUpdating list of all valid TLDs")
-    headers = {'Accept': 'application/json', 'Content-Type': 'application/json',
-               'Authorization': 'sso-key {}:{}'.format(api_key, secret_key)}
-    url = "https://" + api_domain + "/v1/domains/tlds"
-    response = get(url, headers=headers)
-    json = response.json()
-    try:
-        vals = []
-        if isinstance(json, dict):
-            raise KeyError
-        for x in json:
-            vals.append(x["name"])
-        with open('all_tlds.csv', "w", newline='') as csv_file:
-            for v in vals:
-                csv_file.write(".")
-                csv_file.write(v)
-                csv_file.write('\n')
-        log_print("INFO:\tValid TLDs list had been updated")
-    except KeyError:
-        log_print("ERROR:\t" + json["code"] + "\tMessage: " + json["message"])
-        log_print("INFO:\tValid TLDs could not be updated")
+def print_loading(load_counter):
+    """ Helper function to display loading text to indicate the script has not frozen """
+    load_str = "Loading "
+    match (load_counter % 4):
+        case 0:
+            load_str += "\\"
+        case 1:
+            load_str += "|"
+        case 2:
+            load_str += "/"
+        case 3:
+            load_str += "\u2015"
+    print("\r", load_str, sep="", end="")
 
 
-def is_valid_domain(string):
-    """ Helper function to check if a domain is valid """
-    valid_chars = possible_vals + "."
-    if string.find(".") != -1:
-        if (not all(c in valid_chars for c in string)) or string[0] == '-' or string[string.find(".") - 1] == '-' \
-                or "--" in string or ".." in string:
-            return False
+def check_concurrently(func, items, on_result=None):
+    """ Calls the param function on each item using up to 'concurrent_requests' threads; returns the results in the
+    same order as the items, passing each item and its result to the 'on_result' function as they complete """
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
+        for i, result in enumerate(executor.map(func, items)):
+            results.append(result)
+            if on_result:
+                on_result(items[i], result)
+            if i % 5 == 0:
+                print_loading(i // 5)
+    return results
+
+
+def get_data(top_level_domains, root_domains, checkpoint=None, results=None):
+    """ Checks the availability [calls the get_status() or get_bulk_status() function] of each instance in the
+    cartesian product of the root and TLD sets, 'chunk_size' roots at a time; yields each root domain and its row of
+    status codes (in TLD order) as its chunk completes. If a results matrix (roots x TLDs) is given, the codes are
+    stored in it. Domains with a fresh status in the cache, or already recorded in the checkpoint when resuming, are
+    not rechecked, and those the pre-filter finds to be registered are marked unavailable without being checked """
+    resumed = checkpoint.load() if checkpoint else {}
+    known_count = 0
+    filtered_count = 0
+    checked_count = 0
+    offset = 0
+    roots = iter(root_domains)
+    while True:
+        with metrics.timer("root_generation_seconds"):
+            chunk = list(islice(roots, chunk_size))
+        if not chunk:
+            break
+        chunk_started = monotonic()
+        urls = [root + top for top in top_level_domains for root in chunk]
+        statuses = {url.lower(): resumed.pop(url.lower()) for url in urls if url.lower() in resumed}
+        if status_cache:
+            statuses.update(status_cache.get_many([url for url in urls if url.lower() not in statuses]))
+        urls = [url for url in urls if url.lower() not in statuses]
+        known = len(statuses)
+        filtered = {}
+        if pre_filter and urls:
+            with metrics.timer("prefilter_seconds"):
+                filtered = pre_filter.filter(urls)
+            if filtered:
+                if checkpoint:
+                    checkpoint.record(filtered)
+                statuses.update(filtered)
+                urls = [url for url in urls if url.lower() not in filtered]
+        metrics.event("chunk", roots=len(chunk), known=known, prefiltered=len(filtered), to_check=len(urls))
+        metrics.add("domains_prefiltered", len(filtered))
+        known_count += known
+        filtered_count += len(filtered)
+        checked_count += len(urls)
+        check_with_retries(urls, lambda new_statuses: record_statuses(statuses, new_statuses, checkpoint))
+        metrics.add("domains_checked", len(urls))
+        metrics.event("chunk_checked", domains=len(urls), seconds=round(monotonic() - chunk_started, 3))
+        if results is None:
+            block = numpy.zeros((len(chunk), len(top_level_domains)), dtype=numpy.uint8)
+        else:
+            block = results[offset:offset+len(chunk)]
+        for j, top in enumerate(top_level_domains):
+            block[:, j] = [STATUS_CODES[statuses.get((root + top).lower(), "Unknown")] for root in chunk]
+        offset += len(chunk)
+        yield from zip(chunk, block)
+    log_print("\rINFO:\tSearch Complete. {} domains already known, {} pre-filtered, {} checked"
+              .format(known_count, filtered_count, checked_count))
+
+
+def record_statuses(statuses, new_statuses, checkpoint=None):
+    """ Helper function that adds newly found statuses to the param statuses and saves them to the cache, history and
+    checkpoint as they come in """
+    if status_cache:
+        status_cache.put_many(new_statuses)
+    if history:
+        history.record(new_statuses)
+    if checkpoint:
+        checkpoint.record(new_statuses)
+    statuses.update(new_statuses)
+
+
+def check_with_retries(urls, on_statuses):
+    """ Checks the availability of each of the param domains, passing the statuses to 'on_statuses' as they come in.
+    Domains that fail due to network based errors are deferred to a retry queue that is worked through (with backoff)
+    once the others are checked, so they do not hold up the rest; any still failing after the last retry are left out
+    and so marked 'Unknown' (without being cached or checkpointed, so a resumed or later run will recheck them) """
+    pending = urls
+    attempt = 0
+    while pending := check_statuses(pending, on_statuses):
+        if attempt >= retry_policy.max_retries:
+            log_print("\rERROR:\t{} domains could not be checked after {} retries and have been marked Unknown"
+                      .format(len(pending), attempt))
+            return
+        delay = retry_policy.backoff(attempt)
+        log_print("\rINFO:\t{} domains failed due to network based errors. Will reattempt in {:.0f} seconds. "
+                  "Attempt {}".format(len(pending), delay, attempt + 1), False)
+        metrics.add("retries", len(pending))
+        metrics.add("retry_wait_seconds", delay)
+        metrics.event("retry", domains=len(pending), attempt=attempt + 1, delay=round(delay, 3))
+        sleep(delay)
+        attempt += 1
+
+
+def check_statuses(urls, on_statuses):
+    """ Checks the availability of each of the param domains [calls the get_status() or get_bulk_status() function,
+    the latter in batches of up to 'bulk_size' domains per call], passing the statuses to 'on_statuses' as they come
+    in; returns the domains that could not be checked """
+    failed = []
+    if bulk_search:
+        def on_batch(batch, batch_statuses):
+            """ Passes on the batch's statuses and notes any domains left out of them """
+            failed.extend(url for url in batch if url.lower() not in batch_statuses)
+            on_statuses(batch_statuses)
+        check_concurrently(get_bulk_status, [urls[i:i+bulk_size] for i in range(0, len(urls), bulk_size)], on_batch)
     else:
-        if (not all(c in possible_vals for c in string)) or string[0] == '-' or string[-1] == '-' \
-                or "--" in string:
-            return False
-    return True
+        def on_status(url, status):
+            """ Passes on the domain's status or notes it if it could not be checked """
+            if status is None:
+                failed.append(url)
+            else:
+                on_statuses({url.lower(): status})
+        check_concurrently(get_status, urls, on_status)
+    return failed
+
+
+def is_valid_domain(string):
+    """ Helper function to check if a (normalised) domain, or root domain if it has no TLD, is valid """
+    return (DOMAIN_REGEX if "." in string else ROOT_DOMAIN_REGEX).fullmatch(string) is not None
+
+
+def normalise_domain(string):
+    """ Helper function to normalise a domain, root domain or TLD to lowercase and IDNA (punycode); returns None if it
+    cannot be encoded """
+    string = string.strip().lower()
+    if not string.isascii():
+        try:
+            string = string.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    return string
+
+
+def import_domains(path, is_valid, supported=None):
+    """ Streams the domains in the first column of the param csv, normalising and de-duplicating them; returns the
+    valid (and if a set of supported domains is given, supported) domains in their original order and a list of the
+    rejected rows (row number, value and reason) """
+    domains = {}  # an insertion ordered set
+    rejected = []
+    duplicates = 0
+    with open(path, newline='', encoding="utf-8-sig") as input_file:
+        for row_num, row in enumerate(csv.reader(input_file), 1):
+            if not row or not row[0].strip():
+                continue
+            domain = normalise_domain(row[0])
+            if domain is None:
+                rejected.append((row_num, row[0], "cannot be IDNA encoded"))
+            elif not is_valid(domain):
+                rejected.append((row_num, row[0], "invalid"))
+            elif supported is not None and domain not in supported:
+                rejected.append((row_num, row[0], "not supported by the API"))
+            elif domain in domains:
+                duplicates += 1
+            else:
+                domains[domain] = None
+    if duplicates:
+        log_print("INFO:\t{} duplicate rows in {} were skipped".format(duplicates, path))
+    if rejected:
+        examples = ", ".join("row {} '{}' ({})".format(*rejection) for rejection in rejected[:5])
+        log_print("INFO:\t{} rows in {} were rejected (all are listed in the logs folder): {}{}"
+                  .format(len(rejected), path, examples, ", ..." if len(rejected) > 5 else ""))
+        with open("logs/" + log_title + "_rejected.csv", "a", newline='') as rejected_file:
+            csv.writer(rejected_file).writerows([path] + list(rejection) for rejection in rejected)
+    return list(domains), rejected
+
+
+@lru_cache(maxsize=None)
+def read_tlds():
+    """ Reads and validates the TLDs in the 'tlds.csv' file once, as it is imported for every search; TLDs not
+    supported by the API are dropped so that no calls are spent on them """
+    supported = tld_registry.supported()
+    if supported is None:
+        log_print("INFO:\tNo list of valid TLDs (all_tlds.csv) so TLDs will not be checked against it")
+    top_level_domains = import_domains('tlds.csv', lambda tld: tld[:1] == "." and is_valid_domain(tld[1:]),
+                                       supported)[0]
+    return tuple(top_level_domains)
 
 
 def import_tlds():
     """ Imports the TLDs to be searched from the 'tlds.csv' file """
-    top_level_domains = []
-    with open('tlds.csv', newline='') as input_file:
-        for row in csv.reader(input_file):
-            top_level_domains.append(row[0])
-    return top_level_domains
+    return list(read_tlds())
 
 
 def import_root_domains():
     """ Imports the root domains to be searched from the 'root_domains.csv' file """
-    root_domains = []
-    with open('root_domains.csv', newline='') as input_file:
-        for row in csv.reader(input_file):
-            if is_valid_domain(row[0]):
-                root_domains.append(row[0])
-    return root_domains
+    return import_domains('root_domains.csv', is_valid_domain)[0]
 
 
 def specific_search():
@@ -228,121 +1386,310 @@ def specific_search():
     if not root_domains or not top_level_domains:
         log_print("INFO:\tRoot or TLD list is empty. No data to export")
     else:
-        # Get the statuses of the domains' availabilities and convert it to a DataFrame
-        data = get_data(top_level_domains, root_domains)
-        df = pandas.DataFrame(data, index=root_domains)
-        # Export the data
-        export_to_excel(df, "DomainResults")
+        run_search(top_level_domains, root_domains, "DomainResults")
         log_print("INFO:\tSpecific Search Data Exported")
 
 
-def create_gen_root_2():
-    """ Creates a list of all possible strings that can be used as a root domain that are 2 chars in length """
-    strings = []
-    for i in possible_vals[possible_vals.index(gen_s_begin[0]):possible_vals.index(gen_s_end[0])+1]:
-        for j in possible_vals[:-1]:
-            word = i + j
-            if is_valid_domain(word):
-                if get_general_value(word) < gen_s_min_val:
-                    pass
-                elif get_general_value(word) > gen_s_max_val:
-                    return strings
-                else:
-                    strings.append(word)
-    return strings
-
-
-def create_gen_root_3():
-    """ Creates a list of all possible strings that can be used as a root domain that are 3 chars in length """
-    strings = []
-    for i in possible_vals[possible_vals.index(gen_s_begin[0]):possible_vals.index(gen_s_end[0])+1]:
-        for j in possible_vals:
-            for k in possible_vals[:-1]:
-                word = i + j + k
-                if is_valid_domain(word):
-                    if get_general_value(word) < gen_s_min_val:
-                        pass
-                    elif get_general_value(word) > gen_s_max_val:
-                        return strings
-                    else:
-                        strings.append(word)
-    return strings
-
-
-def create_gen_root_4():
-    """ Creates a list of all possible strings that can be used as a root domain that are 4 chars in length """
-    strings = []
-    for i in possible_vals[possible_vals.index(gen_s_begin[0]):possible_vals.index(gen_s_end[0])+1]:
-        for j in possible_vals:
-            for k in possible_vals:
-                for l in possible_vals[:-1]:
-                    word = i + j + k + l
-                    if is_valid_domain(word):
-                        if get_general_value(word) < gen_s_min_val:
-                            pass
-                        elif get_general_value(word) > gen_s_max_val:
-                            return strings
-                        else:
-                            strings.append(word)
-    return strings
-
-
-def create_gen_root_5_end4(fchar):
-    """ Creates a list of all possible strings that can be used as a root domain that are 4 chars in length with the
-    param char prepended to each [list of strings w/ len 5 char] """
-    strings = []
-    for i in possible_vals:
-        for j in possible_vals:
-            for k in possible_vals:
-                for l in possible_vals[:-1]:
-                    word = i + j + k + l
-                    if word[-1] != '-' and "--" not in word:
-                        if get_general_value(fchar+word) < gen_s_min_val:
-                            pass
-                        elif get_general_value(fchar+word) > gen_s_max_val:
-                            return strings
-                        else:
-                            strings.append(fchar+word)
-    return strings
-
-
 def general_search(length, char=""):
     """ Starts the general search process; establishes object values and calls sub-functions """
     if char == "":
         log_print("INFO:\tBeginning search with root domains of " + str(length) + " characters")
     else:
         log_print("INFO:\tBeginning search with root domains of " + str(length) + " characters, beginning with " + char)
-    # Get the top-level domains from the csv and generate the root domains
+    # Get the top-level domains from the csv and the (lazily generated) root domains
     top_level_domains = import_tlds()
-    root_domains = []
-    match length:
-        case 2:
-            root_domains = create_gen_root_2()
-        case 3:
-            root_domains = create_gen_root_3()
-        case 4:
-            root_domains = create_gen_root_4()
-        case 5:
-            root_domains = create_gen_root_5_end4(char)
-        case _:
-            log_print("STATUS:\tAborting due to error with general search length")
-            log_print("INFO:\tThis should be impossible, so contact me if you're reading this")
-            exit(1)
+    if char == "":
+        root_domains = GeneralRoots(length, gen_s_min_val, gen_s_max_val)
+    else:  # only the roots within the bounds that begin with the param char
+        char_val = possible_vals.index(char) * pow(37, length - 1)
+        root_domains = GeneralRoots(length, max(gen_s_min_val, char_val),
+                                    min(gen_s_max_val, char_val + pow(37, length - 1) - 1))
     if not root_domains or not top_level_domains:
         log_print("INFO:\tRoot or TLD list is empty. No data to export")
     else:
-        # Get the statuses of the domains' availabilities and convert it to a DataFrame
-        data = get_data(top_level_domains, root_domains)
-        df = pandas.DataFrame(data, index=root_domains)
-        # Export the data
-        if length < 5:
-            export_to_excel(df, "DomainResults" + str(length) + "chars_" +
-                            gen_s_begin + "-" + gen_s_end)
+        if char == "":
+            filename = "DomainResults" + str(length) + "chars_" + gen_s_begin + "-" + gen_s_end
         else:
-            export_to_excel(df, "5chars/DomainResults" + str(length) + "begin" + char.upper())
+            check_make_folder(filepath + str(length) + "chars")
+            filename = str(length) + "chars/DomainResults" + str(length) + "begin" + char.upper()
+        run_search(top_level_domains, root_domains, filename)
         log_print("INFO:\tGeneral Search Data Exported")
 
 
+def run_search(top_level_domains, root_domains, filename):
+    """ Gets the statuses of the domains' availabilities and exports them as they are found. When run as a shard only
+    this shard's share of the root domains is searched, and when merging, the shards' exports are combined instead """
+    if merge_shards and (diff_mode or priority_mode):
+        log_print("INFO:\tDiff and priority mode exports are kept per shard, so there is nothing to merge")
+        return
+    if merge_shards:
+        log_print("INFO:\tMerging the exports of {} shards".format(merge_shards))
+        results = numpy.zeros((len(root_domains), len(top_level_domains)), dtype=numpy.uint8)
+        check_shard_sizes(filename, len(root_domains))
+        export_results(read_shard_rows(filename, top_level_domains, root_domains, results), top_level_domains,
+                       filename)
+    else:
+        if shard:
+            root_domains = root_domains[len(root_domains) * (shard[0] - 1) // shard[1]:
+                                        len(root_domains) * shard[0] // shard[1]]
+            filename += shard_suffix(shard[0], shard[1])
+            log_print("INFO:\tSearching shard {} of {} ({} root domains)".format(shard[0], shard[1], len(root_domains)))
+        if diff_mode:
+            diff_search(top_level_domains, root_domains, filename)
+            return
+        if priority_mode:
+            priority_search(top_level_domains, root_domains, filename)
+            return
+        checkpoint = Checkpoint(filename)
+        results = numpy.zeros((len(root_domains), len(top_level_domains)), dtype=numpy.uint8)
+        export_results(get_data(top_level_domains, root_domains, checkpoint, results), top_level_domains, filename)
+        checkpoint.clear()
+    log_summary(results, top_level_domains, root_domains)
+
+
+def diff_search(top_level_domains, root_domains, filename):
+    """ Rechecks the domains of the search most in need of it (up to the 'diff_budget') and exports only the domains
+    whose status has changed since they were last checked. Domains that were available, changed recently or have not
+    been checked before are rechecked first, while the longer a domain has been unavailable the less often it is """
+    now = time()
+    # min-heap of (priority, -rank, domain), so the lowest priority (and among equals the last in search order) is
+    # replaced first once over budget
+    candidates = []
+    rank = 0
+    roots = iter(root_domains)
+    while True:
+        with metrics.timer("root_generation_seconds"):
+            chunk = list(islice(roots, chunk_size))
+        if not chunk:
+            break
+        urls = [root + top for top in top_level_domains for root in chunk]
+        records = history.get_many(urls)
+        for url in urls:
+            rank += 1
+            priority = recheck_priority(records.get(url.lower()), now)
+            if priority is None:
+                continue
+            if diff_budget <= 0 or len(candidates) < diff_budget:
+                heappush(candidates, (priority, -rank, url))
+            else:
+                heappushpop(candidates, (priority, -rank, url))
+    urls = [url for priority, negative_rank, url in sorted(candidates, reverse=True)]
+    log_print("INFO:\t{} domains are due to be rechecked".format(len(urls)))
+    history.take_changes()
+    for i in range(0, len(urls), chunk_size * len(top_level_domains)):
+        batch = urls[i:i + chunk_size * len(top_level_domains)]
+        check_with_retries(batch, lambda new_statuses: record_statuses({}, new_statuses))
+        metrics.add("domains_checked", len(batch))
+    changes = history.take_changes()
+    log_print("\rINFO:\tSearch Complete. {} domains checked".format(len(urls)))
+    became_available = sorted(change[0] for change in changes if change[2] == "Available")
+    log_print("INFO:\t{} domains changed status: {} became Available, {} became Unavailable"
+              .format(len(changes), len(became_available), len(changes) - len(became_available)))
+    if became_available:
+        log_print("\t\tNow available: " + ", ".join(became_available[:20]) +
+                  (", ..." if len(became_available) > 20 else ""))
+    export_changes(changes, filename + "_changes")
+
+
+def recheck_priority(record, now):
+    """ Returns how urgently a domain with the param history record (status code, checked, changed) should be
+    rechecked as a comparable tuple, or None if it is not yet due """
+    if record is None:
+        return 1, 0  # never checked
+    status, checked, changed = record
+    days_since_check = (now - checked) / 86400
+    if status != STATUS_CODES["Unavailable"] or now - changed < diff_recent_days * 86400:
+        return 2, days_since_check
+    # the longer a domain has been unavailable, the longer it is left between rechecks (the longest if it has been
+    # unavailable since it was first checked)
+    stable_days = (checked - changed) / 86400
+    interval = min(diff_max_interval_days, diff_unavailable_interval_days * (1 + stable_days / 30))
+    if days_since_check < interval:
+        return None
+    return 0, days_since_check / max(interval, 1)
+
+
+def export_changes(changes, filename):
+    """ Exports the param list of status changes (domain, previous status, status, previously checked) """
+    export_list(["Domain", "Previous Status", "Current Status", "Previously Checked"],
+                [[domain, previous, status, strftime("%Y-%m-%d %H:%M", localtime(checked))]
+                 for domain, previous, status, checked in sorted(changes)], filename)
+
+
+def export_list(header, rows, filename):
+    """ Exports the param rows, with the domain in their first column, under the param header """
+    try:
+        if export_format == "csv":
+            with open(filepath + filename + ".csv", "w", newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(header)
+                writer.writerows(rows)
+        else:
+            with xlsxwriter.Workbook(filepath + filename + ".xlsx", {'constant_memory': True}) as workbook:
+                header_form = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+                sheet = None
+                for i, row in enumerate(rows):
+                    row_num = i % (EXCEL_MAX_ROWS - 1) + 1
+                    if row_num == 1:  # the first row, or the last sheet is full, so continue on a new one
+                        sheet = workbook.add_worksheet("Sheet" + str(len(workbook.worksheets()) + 1))
+                        sheet.set_column(0, 0, 30)
+                        sheet.set_column(1, len(header) - 1, 18)
+                        sheet.freeze_panes(1, 0)
+                        sheet.write_row(0, 0, header, header_form)
+                    if sheet.write_row(row_num, 0, row) < 0:
+                        log_print("ERROR:\tResults could not be written to the excel export")
+                        log_print("STATUS:\tAborting due to above error")
+                        exit(1)
+                if sheet is None:
+                    workbook.add_worksheet("Sheet1").write_row(0, 0, header, header_form)
+    except (OSError, xlsxwriter.exceptions.FileCreateError):
+        log_print("ERROR:\tFile export location/path is invalid")
+        log_print("STATUS:\tAborting due to above error")
+        exit(1)
+
+
+def priority_search(top_level_domains, root_domains, filename):
+    """ Checks the domains of the search in order of their score (from the 'name_scorer'), highest first, up to as
+    many as the call budget and deadline allow; exports the domains checked ranked by their score. Domains with a
+    fresh status in the cache, or already recorded in the checkpoint when resuming, do not count towards the budget
+    but are included if they score at least as highly as those checked """
+    budget = priority_budget()
+    deadline = monotonic() + priority_deadline_minutes * 60 if priority_deadline_minutes > 0 else inf
+    checkpoint = Checkpoint(filename)
+    resumed = checkpoint.load()
+    # min-heaps of (score, -rank, domain[, status]), so once over budget the lowest score is replaced first and, of
+    # those scoring the same, the latest in the search's order
+    candidates = []
+    known = []
+    rank = 0
+    tld_scores = [name_scorer.score_tld(top) for top in top_level_domains]
+    roots = iter(root_domains)
+    while True:
+        with metrics.timer("root_generation_seconds"):
+            chunk = list(islice(roots, chunk_size))
+        if not chunk:
+            break
+        urls = [root + top for root in chunk for top in top_level_domains]
+        scores = [root_score + tld_score for root_score in map(name_scorer.score_root, chunk)
+                  for tld_score in tld_scores]
+        found = {url.lower(): resumed.pop(url.lower()) for url in urls if url.lower() in resumed}
+        if status_cache:
+            found.update(status_cache.get_many([url for url in urls if url.lower() not in found]))
+        for url, score in zip(urls, scores):
+            rank += 1
+            if url.lower() in found:
+                heap, item = known, (score, -rank, url, found[url.lower()])
+            else:
+                heap, item = candidates, (score, -rank, url)
+            if budget <= 0 or len(heap) < budget:
+                heappush(heap, item)
+            else:
+                heappushpop(heap, item)
+    candidates.sort(reverse=True)
+    lowest = candidates[-1][0] if budget > 0 and len(candidates) >= budget else -inf
+    ranked = [item for item in known if item[0] >= lowest]
+    log_print("INFO:\t{} domains are to be checked in order of score, {} are already known"
+              .format(len(candidates), len(ranked)))
+    statuses = {}
+    batch_size = chunk_size * len(top_level_domains)
+    for i in range(0, len(candidates), batch_size):
+        if monotonic() >= deadline:
+            log_print("\rINFO:\tPriority search deadline reached; {} domains were left unchecked"
+                      .format(len(candidates) - i))
+            candidates = candidates[:i]
+            break
+        batch = [url for score, rank, url in candidates[i:i + batch_size]]
+        if pre_filter:
+            with metrics.timer("prefilter_seconds"):
+                filtered = pre_filter.filter(batch)
+            if filtered:
+                checkpoint.record(filtered)
+                statuses.update(filtered)
+                batch = [url for url in batch if url.lower() not in filtered]
+        check_with_retries(batch, lambda new_statuses: record_statuses(statuses, new_statuses, checkpoint))
+        metrics.add("domains_checked", len(batch))
+    ranked += [(score, rank, url, statuses.get(url.lower(), "Unknown")) for score, rank, url in candidates]
+    ranked.sort(reverse=True)
+    log_print("\rINFO:\tSearch Complete. {} domains checked".format(len(candidates)))
+    available = [url for score, rank, url, status in ranked if status == "Available"]
+    log_print("INFO:\t{} of the {} highest scoring domains are available".format(len(available), len(ranked)))
+    if available:
+        log_print("\t\tBest available: " + ", ".join(available[:20]) + (", ..." if len(available) > 20 else ""))
+    export_list(["Domain", "Score", "Status"],
+                [[url, round(score, 3), status] for score, rank, url, status in ranked], filename + "_ranked")
+    checkpoint.clear()
+
+
+def priority_budget():
+    """ Helper function for the most domains a priority search can check within its call budget and deadline, given
+    the calls per min of the keys (0 for no limit) """
+    per_call = bulk_size if bulk_search else 1
+    limits = []
+    if priority_call_budget > 0:
+        limits.append(priority_call_budget * per_call)
+    if priority_deadline_minutes > 0 and all(key.rate_limiter.rate > 0 for key in key_pool.keys):
+        calls_per_second = sum(key.rate_limiter.rate for key in key_pool.keys)
+        limits.append(max(1, int(calls_per_second * 60 * priority_deadline_minutes)) * per_call)
+    return min(limits) if limits else 0
+
+
+def shard_suffix(index, count):
+    """ Helper function for the suffix added to the export filename of the param shard """
+    return "_shard{}of{}".format(index, count)
+
+
+def check_shard_sizes(filename, root_count):
+    """ Checks each shard's (csv) export of the param search has a row for every root domain of its share of the
+    search, aborting if not, so that an incomplete merge is never exported """
+    for index in range(1, merge_shards + 1):
+        expected = root_count * index // merge_shards - root_count * (index - 1) // merge_shards
+        with open(filepath + filename + shard_suffix(index, merge_shards) + ".csv", newline='') as csv_file:
+            rows = sum(1 for row in csv.reader(csv_file)) - 1  # less the header
+        if rows != expected:
+            log_print("ERROR:\tShard {} of {} has {} rows but should have {} (one per root domain of its share); it "
+                      "may be incomplete or from a different search"
+                      .format(index, merge_shards, max(rows, 0), expected))
+            log_print("STATUS:\tAborting due to above error")
+            exit(1)
+
+
+def read_shard_rows(filename, top_level_domains, root_domains, results):
+    """ Yields the rows of root domains and status codes from each shard's (csv) export of the param search in order,
+    storing the codes in the param results matrix """
+    row_num = 0
+    roots = iter(root_domains)
+    for index in range(1, merge_shards + 1):
+        with open(filepath + filename + shard_suffix(index, merge_shards) + ".csv", newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            if next(reader, [])[1:] != top_level_domains:
+                log_print("ERROR:\tTLDs of shard {} do not match those in the TLD csv".format(index))
+                log_print("STATUS:\tAborting due to above error")
+                exit(1)
+            for row in reader:
+                if row[0] != next(roots, None):
+                    log_print("ERROR:\tRoot domain '{}' of shard {} is not the one expected there; the shard may be "
+                              "from a different search".format(row[0], index))
+                    log_print("STATUS:\tAborting due to above error")
+                    exit(1)
+                results[row_num] = [STATUS_CODES.get(label, STATUS_CODES["Unknown"]) for label in row[1:]]
+                yield row[0], results[row_num]
+                row_num += 1
+
+
+def log_summary(results, top_level_domains, root_domains):
+    """ Logs a summary of the param results matrix (roots x TLDs of status codes): the number of available domains
+    for each TLD and the root domains that are available on every TLD """
+    available = results == STATUS_CODES["Available"]
+    per_tld = available.sum(axis=0)
+    log_print("INFO:\tAvailable domains per TLD: " +
+              ", ".join(top + " " + str(count) for top, count in zip(top_level_domains, per_tld.tolist())))
+    all_available = numpy.flatnonzero(available.all(axis=1))
+    log_print("INFO:\t{} root domains are available on every TLD".format(len(all_available)))
+    if len(all_available):
+        log_print("\t\t" + ", ".join(root_domains[i] for i in all_available[:20].tolist()) +
+                  (", ..." if len(all_available) > 20 else ""))
+
+
 def get_general_value(word):
     """ Helper function used to determine the 'value' of a word; used when ranking words and defining ranges for the
     general search """
@@ -352,6 +1699,33 @@ def get_general_value(word):
     return ret
 
 
+def run_searches():
+    """ Runs the specific and general searches enabled in the config """
+    global gen_s_begin, gen_s_end, gen_s_min_val, gen_s_max_val
+    read_tlds.cache_clear()  # so changes to the TLDs between the service's searches are picked up
+    if config["run_specific_search"]:  # run search using provided root and TLD csvs
+        specific_search()
+    if config["run_general_search"]:  # run search using provided TLDs for all possible roots of given length
+        # define global variables for word value (used when specifying ranges in general search)
+        gen_s_begin = ""
+        gen_s_end = ""
+        gen_s_min_val = 0
+        gen_s_max_val = 0
+        # run general searches based on the selected lengths and their specified ranges
+        for gen_length in range(2, 64):  # a DNS label is at most 63 chars
+            if config.get("general_" + str(gen_length), False):
+                set_general_bounds(str(gen_length))
+                if gen_length < 5:
+                    general_search(gen_length)
+                else:
+                    # given its runtime and resulting file size, len5+ has been broken up by first char
+                    for first_char in possible_vals[
+                                      possible_vals.index(gen_s_begin[0]):possible_vals.index(gen_s_end[0])+1]:
+                        general_search(gen_length, first_char)
+        if gen_s_end == "":
+            log_print("INFO:\tGlobal general is true, but no lengths were set true. No search data exported.")
+
+
 def set_general_bounds(len_str):
     """ Sets the upper and lower bounds used in the general search """
     globals()['gen_s_begin'] = config["gen_"+len_str+"_begin"]
@@ -361,17 +1735,42 @@ def set_general_bounds(len_str):
 
 
 def log_print(string, to_print=True):
-    """ Log function for printing to the user and also saving to a log txt file """
-    # TODO: Change function to use built-in Python logging
+    """ Log function for printing to the user and also saving to the (buffered) log txt file """
     if to_print:
         print(string)
-    with open("logs/" + log_title + ".txt", "a") as log_file:
-        log_file.write(strftime("%H:%M:%S\t"))
-        if string[0] == "\r":
-            log_file.write(string[1:])
-        else:
-            log_file.write(string)
-        log_file.write("\n")
+    if string[0] == "\r":
+        string = string[1:]
+    logger.log(logging.ERROR if string.startswith("ERROR") else logging.INFO, string)
+
+
+def setup_logging(path):
+    """ Sets up the logger used by log_print(); messages are buffered and written to the param file in blocks, or
+    straight away for errors (and at exit) """
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s\t%(message)s", datefmt="%H:%M:%S"))
+    new_logger = logging.getLogger("DomainChecker")
+    new_logger.setLevel(logging.INFO)
+    new_logger.propagate = False
+    new_logger.addHandler(MemoryHandler(capacity=500, flushLevel=logging.ERROR, target=file_handler))
+    return new_logger
+
+
+def api_url(path):
+    """ Helper function for the full url of the param API path; the API domain may include its own scheme (e.g. a local
+    mock server at "http://localhost:8080"), otherwise https is used """
+    if "://" in api_domain:
+        return api_domain.rstrip("/") + path
+    return "https://" + api_domain + path
+
+
+def create_session():
+    """ Creates the keep-alive session (pooled for the concurrent requests) used for all API calls """
+    new_session = Session()
+    adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrent_requests)
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    new_session.headers.update({'Accept': 'application/json', 'Content-Type': 'application/json'})
+    return new_session
 
 
 def check_make_folder(path):
@@ -380,32 +1779,139 @@ def check_make_folder(path):
         mkdir(path)
 
 
+def serve():
+    """ Runs the service mode until stopped (by Ctrl+C or SIGTERM): the local HTTP/JSON API and, if any are enabled,
+    the searches in the background (repeated every 'daemon_search_interval_hours' if set) """
+    server = ThreadingHTTPServer((config.get("daemon_host", "127.0.0.1"), config.get("daemon_port", 8765)),
+                                 ServiceHandler)
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, stop_service)
+    if config["run_specific_search"] or config["run_general_search"]:
+        Thread(target=background_searches, daemon=True).start()
+    log_print("INFO:\tService listening on http://{}:{}".format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log_print("INFO:\tService stopping")
+    finally:
+        server.server_close()
+
+
+def background_searches():
+    """ Runs the searches for the service, repeating them every 'daemon_search_interval_hours' if set """
+    while True:
+        lookup_service.searching = True
+        try:
+            run_searches()
+        except SystemExit:  # an aborted search should not stop the service
+            pass
+        lookup_service.searching = False
+        if config.get("daemon_search_interval_hours", 0) <= 0:
+            return
+        sleep(config.get("daemon_search_interval_hours", 0) * 3600)
+
+
+def stop_service(signum, frame):
+    """ Signal handler stopping the service as Ctrl+C would """
+    raise KeyboardInterrupt
+
+
 def exit_func():
     """ Atexit function used to stop the compiled program's cmd window from closing on exit """
     junk = input("Press enter to close the program:")
 
 
 if __name__ == "__main__":
+    # Read command line arguments; used to split bulk searches between multiple processes (each with its own config)
+    parser = ArgumentParser(description="DomainChecker using GoDaddy API for bulk availability checking of domains")
+    parser.add_argument("--config", default="config.json", help="config file to use (default: config.json)")
+    parser.add_argument("--shard", metavar="I/N", help="only search shard I of N of each bulk search, e.g. 2/4")
+    parser.add_argument("--merge", type=int, default=0, metavar="N",
+                        help="combine the exports of N shards into the usual results rather than searching")
+    parser.add_argument("--serve", action="store_true",
+                        help="run as a service with a local HTTP/JSON API (as does 'daemon_mode' in the config)")
+    args = parser.parse_args()
+    shard = None
+    if args.shard:
+        try:
+            shard = tuple(int(v) for v in args.shard.split("/"))
+        except ValueError:
+            shard = ()
+        if len(shard) != 2 or not 1 <= shard[0] <= shard[1]:
+            parser.error("--shard must be of the form I/N with 1 <= I <= N")
+    merge_shards = args.merge
+    if shard and merge_shards:
+        parser.error("--shard and --merge cannot be used together")
     # Begin logging
     check_make_folder("logs")
     log_title = strftime("log_%Y%m%d_%H%M%S")
+    if shard:
+        log_title += shard_suffix(shard[0], shard[1])
     with open("logs/" + log_title + ".txt", "a") as log_f:
         log_f.write("Log file for DomainChecker using the GoDaddy API. Written by Mattias for Ben @ Cre8ive IT\n")
         log_f.write(strftime("Log file for run beginning: %x %X\n\n"))
+    logger = setup_logging("logs/" + log_title + ".txt")
+    metrics = Metrics("logs/" + log_title + "_metrics.jsonl")
+    atexit.register(metrics.summary)  # in case of an early exit; otherwise summarised at the end of the run
     try:
         # Check existence of config json and read data accordingly
-        f = open('config.json')
+        f = open(args.config)
         config = load(f)
         f.close()
         api_domain = config["api_domain"]
-        api_key = config["api_key"]
-        secret_key = config["secret_key"]
+        serve_mode = args.serve or config.get("daemon_mode", False)
         calls_per_min = config["calls_per_min"]
-        cpm_t0 = time()
-        net_attempt_counts = 0
+        resume = config.get("resume", True)
+        chunk_size = max(1, config.get("chunk_size", 1000))
+        export_format = config.get("export_format", "xlsx")
+        if shard:  # shard exports are only intermediate, so use csv (which can be read back when merging)
+            export_format = "csv"
+        bulk_search = config.get("bulk_search", True)
+        bulk_size = max(1, min(config.get("bulk_size", 500), 500))  # API accepts at most 500 domains per bulk call
+        concurrent_requests = max(1, config.get("concurrent_requests", 4))
+        # a list of credentials can be given to spread calls across multiple keys, each with their own rate limit
+        credentials = config.get("credentials") or [{"api_key": config["api_key"], "secret_key": config["secret_key"]}]
+        key_pool = KeyPool([ApiKey(i, c["api_key"], c["secret_key"], c.get("calls_per_min", calls_per_min))
+                            for i, c in enumerate(credentials)])
+        session = create_session()
+        retry_policy = RetryPolicy(config.get("max_retries", 5), config.get("retry_base_delay", 10),
+                                   config.get("retry_max_delay", 600), config.get("circuit_breaker_threshold", 10))
+        status_cache = None
+        if config.get("use_cache", True):
+            status_cache = StatusCache(config.get("cache_file", "status_cache.sqlite"),
+                                       {"Available": config.get("cache_available_ttl_hours", 12) * 3600,
+                                        "Unavailable": config.get("cache_unavailable_ttl_hours", 168) * 3600},
+                                       config.get("cache_max_entries", 20000000))
+        history = None
+        if config.get("use_history", True):
+            history = HistoryStore(config.get("history_file", "status_history.sqlite"))
+        pre_filter = None
+        if config.get("use_prefilter", False) and (not config["single_search"] or serve_mode):
+            pre_filter = PreFilter(config.get("prefilter_zone_files", []), config.get("prefilter_resolver", ""),
+                                   config.get("prefilter_resolver_port", 53), config.get("prefilter_timeout", 2),
+                                   config.get("prefilter_concurrency", 32))
+        diff_mode = config.get("diff_mode", False)
+        if diff_mode and history is None:  # otherwise a full search would overwrite the full results instead
+            log_print("ERROR:\tDiff mode requires use_history to be enabled")
+            log_print("STATUS:\tAborting due to above error")
+            exit(1)
+        priority_mode = config.get("priority_mode", False)
+        name_scorer = None
+        if priority_mode and (not config["single_search"] or serve_mode):
+            name_scorer = NameScorer(config.get("priority_dictionary", ""), config.get("priority_weights", {}),
+                                     config.get("priority_tlds", [".com", ".net", ".org"]))
+        priority_call_budget = config.get("priority_call_budget", 0)
+        priority_deadline_minutes = config.get("priority_deadline_minutes", 0)
+        diff_budget = config.get("diff_budget", 50000)
+        diff_recent_days = config.get("diff_recent_days", 7)
+        diff_unavailable_interval_days = config.get("diff_unavailable_interval_days", 7)
+        diff_max_interval_days = config.get("diff_max_interval_days", 90)
         log_print("--Launching DomainChecker--")
         possible_vals = ascii_lowercase + digits + "-"
-        if config["single_search"]:
+        # the TLDs supported by the API; refreshed if 'get_tlds' is set or once the cached list is old enough
+        tld_registry = TldRegistry("all_tlds.csv", config.get("tld_refresh_days", 30))
+        tld_registry.refresh(config["get_tlds"])
+        if config["single_search"] and not serve_mode:
             # Start the command-line based search process for manual searches
             single_search_string = ""
             while single_search_string.lower() != "exit":
@@ -415,10 +1921,13 @@ if __name__ == "__main__":
                         (config["run_specific_search"] and config["run_general_search"]):
                     log_print("\tProgram developed by Mattias Przyrembel for Ben @ Cre8ive IT")
                 elif single_search_string.lower() != "exit":
+                    single_search_string = normalise_domain(single_search_string) or ""
                     if '.' not in single_search_string or not is_valid_domain(single_search_string):
                         print("Invalid entry. That is not a full and valid domain.")
+                    elif not tld_registry.is_supported(single_search_string):
+                        print("Invalid entry. That TLD is not supported by the API.")
                     else:
-                        log_print("\"" + single_search_string + "\" is: " + get_status(single_search_string))
+                        log_print("\"" + single_search_string + "\" is: " + get_single_status(single_search_string))
         else:
             # Else will conduct bulk search; will have file exports, so check export location validity
             filepath = ""
@@ -436,37 +1945,23 @@ if __name__ == "__main__":
                 check_make_folder("outputs")
                 check_make_folder("outputs\\5chars")
                 filepath = "outputs/"
-            atexit.register(exit_func)
-            if config["get_tlds"]:  # run search to update csv of all TLDs supported by the API
-                get_all_valid_tlds()
-            if config["run_specific_search"]:  # run search using provided root and TLD csvs
-                specific_search()
-            if config["run_general_search"]:  # run search using provided TLDs for all possible roots of given length
-                # define global variables for word value (used when specifying ranges in general search)
-                gen_s_begin = ""
-                gen_s_end = ""
-                gen_s_min_val = 0
-                gen_s_max_val = 0
-                # run general searches based on the selected lengths and their specified ranges
-                if config["general_2"]:
-                    set_general_bounds("2")
-                    general_search(2)
-                if config["general_3"]:
-                    set_general_bounds("3")
-                    general_search(3)
-                if config["general_4"]:
-                    set_general_bounds("4")
-                    general_search(4)
-                if config["general_5"]:
-                    # given its runtime and resulting file size, len5 has been broken up by first char
-                    set_general_bounds("5")
-                    for first_char in possible_vals[
-                                      possible_vals.index(gen_s_begin[0]):possible_vals.index(gen_s_end[0])+1]:
-                        general_search(5, first_char)
-                if gen_s_end == "":
-                    log_print("INFO:\tGlobal general is true, but no lengths were set true. No search data exported.")
+            check_make_folder("checkpoints")
+            if serve_mode:  # runs unattended, so there is no prompt on exit
+                daemon_lookup_timeout = config.get("daemon_lookup_timeout", 30)
+                lookup_service = LookupService(config.get("daemon_batch_wait", 0.5),
+                                               config.get("daemon_job_ttl_minutes", 60) * 60)
+                serve()
+            else:
+                atexit.register(exit_func)
+                run_searches()
+        if status_cache:
+            status_cache.close()
+        if history:
+            history.close()
+        key_pool.log_usage()
+        metrics.summary()
         log_print("--Exiting DomainChecker--")
-    except FileNotFoundError:
-        log_print("ERROR:\tCritical file (" + FileNotFoundError.filename + ") cannot be found")
+    except FileNotFoundError as error:
+        log_print("ERROR:\tCritical file (" + error.filename + ") cannot be found")
         log_print("STATUS:\tAborting due to above error")
         exit(1)
@@ -0,0 +1,262 @@
+""" End-to-end throughput benchmark for DomainChecker using the offline mock API
+
+Runs DomainChecker (as its own process, in a temporary folder) against mock_server.py for the specific and general
+search paths, in single and bulk mode, and reports for each run: domains checked per second, p50/p99 call latency (as
+measured at the mock server), API quota utilisation (accepted calls against the per-key rate limit over the time calls
+were being made) and the peak RSS of the DomainChecker process.
+
+With --generator, it instead micro-benchmarks generating the general search's root domains with GeneralRoots against
+the nested loop generators it replaced (create_gen_root_2/3/4/5_end4, reproduced below), checking both give the same
+roots.
+
+With --diff-runs, it instead runs the specific search in diff mode that many times in a row (each rechecking up to
+--diff-budget domains), checking that every run after the first reaches domains not yet in the history while any
+remain, so a budget smaller than the search cannot keep rechecking the same domains; it exits with code 1 if not.
+
+    Usage:  python benchmark.py [--roots 200] [--general aaa-azz] [--modes single,bulk] [--json results.json]
+            python benchmark.py --generator aa-99,aaa-999,aaaa-a999,aaaaa-a9999
+            python benchmark.py --diff-runs 3 --diff-budget 200
+"""
+
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import monotonic, perf_counter
+from itertools import product
+from string import ascii_lowercase, digits
+from os.path import abspath, dirname, join
+from sys import executable, platform, exit
+import subprocess
+import sqlite3
+import json
+import os
+from mock_server import start_server, start_dns_server
+import DomainChecker
+
+REPO_DIR = dirname(abspath(__file__))
+POSSIBLE_VALS = ascii_lowercase + digits + "-"
+
+
+def write_inputs(folder, args, scenario, bulk, port, dns_port):
+    """ Writes the config and csv files for a benchmark run to the param folder """
+    with open(join(REPO_DIR, "config.json")) as config_file:
+        config = json.load(config_file)
+    config.update({"api_domain": "http://localhost:{}".format(port), "credentials": [], "filepath": "./",
+                   "calls_per_min": args.rate_limit, "concurrent_requests": args.concurrency, "bulk_search": bulk,
+                   "use_cache": False, "resume": False, "single_search": False, "get_tlds": False,
+                   "run_specific_search": scenario == "specific", "run_general_search": scenario == "general"})
+    config.update({"use_prefilter": bool(dns_port), "prefilter_zone_files": [], "prefilter_resolver": "localhost",
+                   "prefilter_resolver_port": dns_port})
+    if args.keys > 1:
+        config["credentials"] = [{"api_key": "bench-key-{}".format(i), "secret_key": "secret"}
+                                 for i in range(args.keys)]
+    for key in list(config):  # only the benchmarked general search length is run
+        if key.startswith("general_"):
+            config[key] = False
+    begin, end = args.general.split("-", 1)
+    config["general_" + str(len(begin))] = True
+    config["gen_{}_begin".format(len(begin))] = begin
+    config["gen_{}_end".format(len(begin))] = end
+    with open(join(folder, "config.json"), "w") as config_file:
+        json.dump(config, config_file, indent=2)
+    with open(join(folder, "tlds.csv"), "w") as tld_file:
+        tld_file.write("\n".join(args.tlds.split(",")) + "\n")
+    with open(join(folder, "root_domains.csv"), "w") as root_file:
+        root_file.write("\n".join("benchroot{}".format(i) for i in range(args.roots)) + "\n")
+
+
+def run_checker(folder):
+    """ Runs DomainChecker in the param folder; returns its exit code and peak RSS in MB (None if unavailable) """
+    process = subprocess.Popen([executable, join(REPO_DIR, "DomainChecker.py")], cwd=folder,
+                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    process.stdin.write(b"\n")  # answers the prompt shown when the program exits
+    process.stdin.close()
+    if not hasattr(os, "wait4"):  # e.g. Windows
+        return process.wait(), None
+    pid, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if platform == "darwin" else 1024)  # bytes on macOS, else KB
+    return process.returncode, peak_rss
+
+
+def run_benchmark(args, scenario, bulk):
+    """ Runs one benchmark scenario against a fresh mock server; returns its results """
+    server = start_server(latency=args.latency, jitter=args.latency / 4, error_rate=args.error_rate,
+                          drop_rate=args.drop_rate, rate_limit=args.rate_limit)
+    dns_server = start_dns_server(server.RequestHandlerClass.state) if args.prefilter else None
+    try:
+        with TemporaryDirectory() as folder:
+            write_inputs(folder, args, scenario, bulk, server.server_port,
+                         dns_server.server_address[1] if dns_server else 0)
+            start = monotonic()
+            exit_code, peak_rss = run_checker(folder)
+            wall = monotonic() - start
+        stats = server.RequestHandlerClass.state.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+        if dns_server:
+            dns_server.shutdown()
+            dns_server.server_close()
+    quota = args.rate_limit * max(1, stats["keys"]) * stats["active_seconds"] / 60
+    return {"scenario": scenario, "mode": "bulk" if bulk else "single", "exit_code": exit_code,
+            "seconds": round(wall, 2), "domains": stats["domains"], "calls": stats["calls"],
+            "throttled": stats["throttled"], "dns_queries": stats["dns_queries"],
+            "domains_per_sec": round(stats["domains"] / wall, 1),
+            "p50_ms": round(stats["p50_latency"] * 1000, 1), "p99_ms": round(stats["p99_latency"] * 1000, 1),
+            "quota_used": round(stats["accepted_calls"] / quota, 3) if quota > 0 else None,
+            "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None}
+
+
+def run_diff_check(args):
+    """ Runs the specific search in diff mode 'diff_runs' times in the same folder against one mock server; returns
+    the results of each run, noting whether it moved on to domains not yet in the history """
+    server = start_server(latency=args.latency, jitter=args.latency / 4, error_rate=args.error_rate,
+                          drop_rate=args.drop_rate, rate_limit=args.rate_limit)
+    state = server.RequestHandlerClass.state
+    results = []
+    try:
+        with TemporaryDirectory() as folder:
+            write_inputs(folder, args, "specific", True, server.server_port, 0)
+            with open(join(folder, "config.json")) as config_file:
+                config = json.load(config_file)
+            config.update({"use_history": True, "history_file": "history.sqlite", "diff_mode": True,
+                           "diff_budget": args.diff_budget})
+            with open(join(folder, "config.json"), "w") as config_file:
+                json.dump(config, config_file, indent=2)
+            universe = args.roots * len(args.tlds.split(","))
+            known = 0
+            for run in range(1, args.diff_runs + 1):
+                checked = state.stats()["domains"]
+                exit_code, peak_rss = run_checker(folder)
+                conn = sqlite3.connect(join(folder, "history.sqlite"))
+                (history_domains,) = conn.execute("SELECT COUNT(*) FROM history").fetchone()
+                conn.close()
+                results.append({"scenario": "diff", "mode": "run {}".format(run), "exit_code": exit_code,
+                                "checked": state.stats()["domains"] - checked, "new_domains": history_domains - known,
+                                "history_domains": history_domains, "universe": universe,
+                                "moved_on": known == universe or history_domains > known})
+                known = history_domains
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def legacy_is_valid_domain(string):
+    """ is_valid_domain as it was before GeneralRoots, for root domains (no TLD) """
+    if (not all(c in POSSIBLE_VALS for c in string)) or string[0] == '-' or string[-1] == '-' or "--" in string:
+        return False
+    return True
+
+
+def legacy_general_roots(length, begin, end, min_val, max_val):
+    """ The general search's roots as the create_gen_root_2/3/4 (or for length 5, create_gen_root_5_end4 for each
+    first char) functions generated them; a list of every valid string of the length, filtered to the bounds """
+    value = DomainChecker.get_general_value
+    strings = []
+    if length == 5:
+        for fchar in POSSIBLE_VALS[POSSIBLE_VALS.index(begin[0]):POSSIBLE_VALS.index(end[0]) + 1]:
+            for i in POSSIBLE_VALS:
+                for j in POSSIBLE_VALS:
+                    for k in POSSIBLE_VALS:
+                        for m in POSSIBLE_VALS[:-1]:
+                            word = i + j + k + m
+                            if word[-1] != '-' and "--" not in word:
+                                if value(fchar + word) < min_val:
+                                    pass
+                                elif value(fchar + word) > max_val:
+                                    break
+                                else:
+                                    strings.append(fchar + word)
+        return strings
+    for first in POSSIBLE_VALS[POSSIBLE_VALS.index(begin[0]):POSSIBLE_VALS.index(end[0]) + 1]:
+        for middle in product(POSSIBLE_VALS, repeat=length - 2):
+            for last in POSSIBLE_VALS[:-1]:
+                word = first + "".join(middle) + last
+                if legacy_is_valid_domain(word):
+                    if value(word) < min_val:
+                        pass
+                    elif value(word) > max_val:
+                        return strings
+                    else:
+                        strings.append(word)
+    return strings
+
+
+def run_generator_benchmark(ranges):
+    """ Times generating (and iterating over) the roots of each param general search range, with the old generators
+    and with GeneralRoots; returns the results """
+    DomainChecker.possible_vals = POSSIBLE_VALS
+    results = []
+    for search_range in ranges:
+        begin, end = search_range.split("-", 1)
+        min_val = DomainChecker.get_general_value(begin)
+        max_val = DomainChecker.get_general_value(end)
+        start = perf_counter()
+        legacy = legacy_general_roots(len(begin), begin, end, min_val, max_val)
+        legacy_seconds = perf_counter() - start
+        start = perf_counter()
+        roots = DomainChecker.GeneralRoots(len(begin), min_val, max_val)
+        generated = list(roots)
+        seconds = perf_counter() - start
+        start = perf_counter()
+        middle = roots[len(roots) // 2]  # random access, as used to slice a search into shards
+        index_us = (perf_counter() - start) * 1e6
+        results.append({"range": search_range, "roots": len(generated), "matches": generated == legacy,
+                        "legacy_seconds": round(legacy_seconds, 3), "seconds": round(seconds, 3),
+                        "speedup": round(legacy_seconds / max(seconds, 1e-9), 1), "index_us": round(index_us, 1),
+                        "middle_root": middle})
+    return results
+
+
+def print_results(results, columns):
+    """ Prints the benchmark results as a table """
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        if result.get("exit_code", 0) != 0:
+            print("WARNING: {} {} run exited with code {}".format(result["scenario"], result["mode"],
+                                                                 result["exit_code"]))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="End-to-end throughput benchmark for DomainChecker using the mock API")
+    parser.add_argument("--scenarios", default="specific,general", help="comma separated: specific, general")
+    parser.add_argument("--modes", default="single,bulk", help="comma separated: single, bulk")
+    parser.add_argument("--roots", type=int, default=200, help="root domains in the specific search")
+    parser.add_argument("--general", default="aaa-acz", help="general search range, e.g. aaa-acz")
+    parser.add_argument("--tlds", default=".com,.net,.org", help="comma separated TLDs to search")
+    parser.add_argument("--rate-limit", type=int, default=600, help="calls per minute per key (client and server)")
+    parser.add_argument("--keys", type=int, default=1, help="number of API keys to spread calls across")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an API error")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of calls whose connection is dropped")
+    parser.add_argument("--prefilter", action="store_true", help="pre-filter domains through the stub DNS resolver")
+    parser.add_argument("--generator", metavar="RANGES",
+                        help="instead micro-benchmark root generation for these comma separated general search ranges")
+    parser.add_argument("--diff-runs", type=int, default=0,
+                        help="instead run the specific search in diff mode this many times, checking each moves on")
+    parser.add_argument("--diff-budget", type=int, default=200, help="domains rechecked per diff mode run")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.diff_runs:
+        results = run_diff_check(args)
+        print_results(results, ["mode", "exit_code", "checked", "new_domains", "history_domains", "universe",
+                                "moved_on"])
+    elif args.generator:
+        results = run_generator_benchmark(args.generator.split(","))
+        print_results(results, ["range", "roots", "matches", "legacy_seconds", "seconds", "speedup", "index_us"])
+    else:
+        results = [run_benchmark(args, scenario, mode == "bulk")
+                   for scenario in args.scenarios.split(",") for mode in args.modes.split(",")]
+        print_results(results, ["scenario", "mode", "seconds", "domains", "calls", "throttled", "dns_queries",
+                                "domains_per_sec", "p50_ms", "p99_ms", "quota_used", "peak_rss_mb"])
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    if not all(result.get("moved_on", True) for result in results):
+        print("ERROR: a diff mode run only rechecked domains already in the history")
+        exit(1)
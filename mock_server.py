@@ -0,0 +1,264 @@
+""" Offline mock of the GoDaddy domains API used by DomainChecker
+
+Implements the endpoints DomainChecker calls -- single (GET) and bulk (POST) /v1/domains/available and
+/v1/domains/tlds -- so that searches can be tested and benchmarked without using the live or OTE API. Latency, error
+rates and the per-key rate limit (answered with TOO_MANY_REQUESTS like the real API) can be configured, and statistics
+on the calls received are served from /stats for the benchmark. A stub DNS resolver answering NS lookups, as the
+registries' zones would, can also be run to test the pre-filter against.
+
+Whether a domain is available is decided by a hash of its name, so results are the same for every run.
+
+    Usage:  python mock_server.py [--port 8080] [--dns-port 5353] [--latency 0.05] [--rate-limit 60] ...
+    Config: "api_domain" : "http://localhost:8080", "prefilter_resolver" : "localhost", "prefilter_resolver_port" : 5353
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingUDPServer, BaseRequestHandler
+from urllib.parse import urlparse, parse_qs
+from threading import Thread, Lock
+from collections import deque
+from argparse import ArgumentParser
+from time import sleep, monotonic
+from random import random, uniform
+from zlib import crc32
+import struct
+import json
+
+
+class MockState:
+    """ Settings and statistics shared by every request handled by the mock server """
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, drop_rate=0.0, rate_limit=60,
+                 available_percent=30, bulk_limit=500, tlds=("com", "net", "org")):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.rate_limit = rate_limit
+        self.available_percent = available_percent
+        self.bulk_limit = bulk_limit
+        self.tlds = list(tlds)
+        self.lock = Lock()
+        self.key_calls = {}  # times of each key's calls within the last minute
+        self.calls = 0
+        self.accepted_calls = 0
+        self.domains = 0
+        self.throttled = 0
+        self.errors = 0
+        self.dropped = 0
+        self.dns_queries = 0
+        self.latencies = []
+        self.first_call = None
+        self.last_call = None
+
+    def is_throttled(self, key):
+        """ Records a call for the param key; returns the seconds until it may call again if it is over its limit """
+        now = monotonic()
+        with self.lock:
+            self.calls += 1
+            self.first_call = self.first_call or now
+            self.last_call = now
+            if self.rate_limit <= 0:
+                return 0
+            times = self.key_calls.setdefault(key, deque())
+            while times and now - times[0] >= 60:
+                times.popleft()
+            if len(times) >= self.rate_limit:
+                self.throttled += 1
+                return max(1, int(60 - (now - times[0])) + 1)
+            times.append(now)
+            return 0
+
+    def is_available(self, domain):
+        """ Deterministically decides if the param domain is available """
+        return crc32(domain.lower().encode()) % 100 < self.available_percent
+
+    def stats(self):
+        """ Returns the statistics of the calls received so far """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {"calls": self.calls, "accepted_calls": self.accepted_calls, "domains": self.domains,
+                    "throttled": self.throttled, "errors": self.errors, "dropped": self.dropped,
+                    "dns_queries": self.dns_queries,
+                    "p50_latency": percentile(latencies, 50), "p99_latency": percentile(latencies, 99),
+                    "active_seconds": (self.last_call - self.first_call) if self.first_call else 0,
+                    "rate_limit": self.rate_limit, "keys": len(self.key_calls)}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """ Request handler answering as the GoDaddy domains API would """
+    protocol_version = "HTTP/1.1"  # keep-alive, as with the real API
+    state = None
+
+    def log_message(self, format, *args):
+        pass  # request logging would only slow the benchmarks down
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self.send_json(200, self.state.stats())
+        elif url.path == "/v1/domains/tlds":
+            self.handle_call(self.list_tlds)
+        elif url.path == "/v1/domains/available":
+            domain = parse_qs(url.query).get("domain", [""])[0]
+            self.handle_call(lambda: self.check_single(domain), domains=1)
+        else:
+            self.send_json(404, {"code": "NOT_FOUND", "message": "Unknown path: " + url.path})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path != "/v1/domains/available":
+            self.send_json(404, {"code": "NOT_FOUND", "message": "Unknown path: " + url.path})
+            return
+        try:
+            domains = json.loads(body)
+        except ValueError:
+            domains = None
+        self.handle_call(lambda: self.check_bulk(domains), domains=len(domains) if isinstance(domains, list) else 0)
+
+    def handle_call(self, respond, domains=0):
+        """ Applies the rate limit, latency and simulated failures to an API call before sending its response """
+        start = monotonic()
+        state = self.state
+        retry_after = state.is_throttled(self.headers.get("Authorization", ""))
+        if retry_after:
+            self.send_json(429, {"code": "TOO_MANY_REQUESTS", "message": "Too many requests",
+                                 "retryAfterSec": retry_after})
+            return
+        if state.latency > 0:
+            sleep(max(0, state.latency + uniform(-state.jitter, state.jitter)))
+        if random() < state.drop_rate:
+            with state.lock:
+                state.dropped += 1
+            self.close_connection = True
+            self.connection.close()  # the client sees this as a network based error
+            return
+        if random() < state.error_rate:
+            with state.lock:
+                state.errors += 1
+            self.send_json(500, {"code": "INTERNAL_SERVER_ERROR", "message": "Simulated server error"})
+            return
+        code, body, *headers = respond()
+        with state.lock:
+            state.accepted_calls += 1
+            state.domains += domains
+            state.latencies.append(monotonic() - start)
+        self.send_json(code, body, *headers)
+
+    def list_tlds(self):
+        """ Response for the list of supported TLDs; answers 304 if the client's ETag is still current """
+        etag = '"{:08x}"'.format(crc32(",".join(self.state.tlds).encode()))
+        if self.headers.get("If-None-Match") == etag:
+            return 304, None, {"ETag": etag}
+        return 200, [{"name": tld, "type": "GENERIC"} for tld in self.state.tlds], {"ETag": etag}
+
+    def check_single(self, domain):
+        """ Response for a single availability check """
+        if "." not in domain:
+            return 422, {"code": "UNSUPPORTED_TLD", "message": "Domain has no TLD: " + domain}
+        return 200, {"available": self.state.is_available(domain), "domain": domain, "definitive": True,
+                     "price": 11990000, "currency": "USD", "period": 1}
+
+    def check_bulk(self, domains):
+        """ Response for a bulk availability check """
+        if not isinstance(domains, list) or not 0 < len(domains) <= self.state.bulk_limit:
+            return 422, {"code": "INVALID_BODY",
+                         "message": "Body must be a list of 1 to {} domains".format(self.state.bulk_limit)}
+        results = []
+        errors = []
+        for domain in domains:
+            if "." in domain:
+                results.append({"available": self.state.is_available(domain), "domain": domain, "definitive": True})
+            else:
+                errors.append({"domain": domain, "code": "UNSUPPORTED_TLD", "message": "Domain has no TLD"})
+        return (203 if errors else 200), {"domains": results, "errors": errors}
+
+    def send_json(self, code, body, headers=None):
+        """ Sends the param body (if any) as a JSON response with any extra headers """
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockDNSHandler(BaseRequestHandler):
+    """ Stub DNS resolver answering NS lookups with a record for domains that are unavailable (so registered) and
+    NXDOMAIN for the rest """
+    state = None
+
+    def handle(self):
+        data, sock = self.request
+        if len(data) < 17:
+            return
+        labels = []
+        pos = 12
+        while pos < len(data) and data[pos]:
+            labels.append(data[pos + 1:pos + 1 + data[pos]].decode("ascii", "ignore"))
+            pos += 1 + data[pos]
+        question = data[12:pos + 5]
+        with self.state.lock:
+            self.state.dns_queries += 1
+        if self.state.is_available(".".join(labels)):
+            header = struct.pack("!HHHHHH", int.from_bytes(data[:2], "big"), 0x8183, 1, 0, 0, 0)
+            sock.sendto(header + question, self.client_address)
+            return
+        target = b"\x03ns1\x04mock\x04test\x00"
+        answer = b"\xc0\x0c" + struct.pack("!HHIH", 2, 1, 3600, len(target)) + target
+        header = struct.pack("!HHHHHH", int.from_bytes(data[:2], "big"), 0x8180, 1, 1, 0, 0)
+        sock.sendto(header + question + answer, self.client_address)
+
+
+def percentile(values, percent):
+    """ Helper function for the param percentile of an already sorted list """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def start_server(port=0, **settings):
+    """ Starts the mock server on a background thread; returns the server (its port is server.server_port) """
+    handler = type("Handler", (MockHandler,), {"state": MockState(**settings)})
+    server = ThreadingHTTPServer(("localhost", port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_dns_server(state, port=0):
+    """ Starts the stub DNS resolver, sharing the param mock state, on a background thread; returns the server """
+    handler = type("DNSHandler", (MockDNSHandler,), {"state": state})
+    server = ThreadingUDPServer(("localhost", port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Offline mock of the GoDaddy domains API used by DomainChecker")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--dns-port", type=int, default=0, help="also run the stub DNS resolver on this port")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to each call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="maximum random seconds added or removed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an API error")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of calls whose connection is dropped")
+    parser.add_argument("--rate-limit", type=int, default=60, help="calls per minute per key (0 for no limit)")
+    parser.add_argument("--available-percent", type=int, default=30, help="percent of domains that are available")
+    args = parser.parse_args()
+    mock_server = start_server(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               drop_rate=args.drop_rate, rate_limit=args.rate_limit,
+                               available_percent=args.available_percent)
+    print("Mock GoDaddy API running at http://localhost:{} (Ctrl+C to stop)".format(mock_server.server_port))
+    if args.dns_port:
+        dns_server = start_dns_server(mock_server.RequestHandlerClass.state, args.dns_port)
+        print("Stub DNS resolver running at localhost:{}".format(dns_server.server_address[1]))
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        mock_server.shutdown()